@@ -0,0 +1,117 @@
+"""Blaze frame decoding (gunzip, JSON, decrypt) in threads vs processes
+
+BlazeClient(decode_processes=N) scales the decode stage by cores,
+threads are held by the GIL. Frames are submitted like the client does:
+one run_in_executor() call per frame from an event loop, at most
+workers * 100 in flight, and every path decrypts with a MessageKeyring.
+
+Run: python -m benchmarks.blaze_decode [frames]
+"""
+import asyncio
+import base64
+import gzip
+import os
+import sys
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import nacl.bindings
+
+from mixinsdk.clients import _blaze
+from mixinsdk.clients._frame import FrameCodec
+from mixinsdk.clients._json import get_default_codec
+from mixinsdk.clients._message import encrypt_message_data
+
+from ._bench_utils import make_app_config
+
+
+def make_frames(config, count: int) -> list:
+    pk = nacl.bindings.crypto_sign_ed25519_sk_to_pk(config.private_key)
+    curve_pk = nacl.bindings.crypto_sign_ed25519_pk_to_curve25519(pk)
+    sessions = [
+        {
+            "session_id": config.session_id,
+            "public_key": base64.urlsafe_b64encode(curve_pk).decode(),
+        }
+    ]
+    codec = get_default_codec()
+    text = "Hello, this is an encrypted message. " * 8
+    frames = []
+    for _ in range(count):
+        data = encrypt_message_data(text.encode(), sessions, config.private_key)
+        # received data is standard base64
+        data = base64.b64encode(base64.urlsafe_b64decode(data + "==")).decode()
+        message = {
+            "id": str(uuid.uuid4()),
+            "action": "CREATE_MESSAGE",
+            "data": {
+                "conversation_id": str(uuid.uuid4()),
+                "user_id": str(uuid.uuid4()),
+                "message_id": str(uuid.uuid4()),
+                "category": "ENCRYPTED_TEXT",
+                "data": data,
+                "created_at": "2022-09-18T08:04:04.073818923Z",
+            },
+        }
+        frames.append(gzip.compress(codec.dumps(message)))
+    return frames
+
+
+async def submit(executor, func, frames: list, max_pending: int):
+    """Like BlazeClient._receive() with decode_processes, results in order"""
+    loop = asyncio.get_running_loop()
+    pending = deque()
+    for frame in frames:
+        pending.append(loop.run_in_executor(executor, func, frame))
+        if len(pending) >= max_pending:
+            await pending.popleft()
+    for decoding in pending:
+        await decoding
+
+
+def run(name: str, executor, func, frames: list, workers: int):
+    with executor:
+        asyncio.run(submit(executor, func, frames[:100], workers * 100))  # warm up
+        start = time.perf_counter()
+        asyncio.run(submit(executor, func, frames, workers * 100))
+        elapsed = time.perf_counter() - start
+    print(f"{name:<36} {len(frames) / elapsed:>12,.0f} frames/sec")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    config = make_app_config("Ed25519")
+    frames = make_frames(config, count)
+    args = (FrameCodec(), True, config.session_id, config.private_key)
+    keyring = config.message_keyring  # as BlazeClient, processes make their own
+
+    def decode(frame):
+        return _blaze.decode_frame(frame, *args, keyring)
+
+    start = time.perf_counter()
+    for frame in frames:
+        decode(frame)
+    elapsed = time.perf_counter() - start
+    print(f"{'inline':<36} {count / elapsed:>12,.0f} frames/sec")
+
+    workers = 1
+    while workers <= (os.cpu_count() or 1):
+        threads = ThreadPoolExecutor(workers)
+        run(f"threads x {workers}", threads, decode, frames, workers)
+        pool = ProcessPoolExecutor(
+            workers, initializer=_blaze.init_decoder_process, initargs=args
+        )
+        run(
+            f"processes x {workers}",
+            pool,
+            _blaze.decode_frame_in_process,
+            frames,
+            workers,
+        )
+        workers *= 2
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""Blaze frame encoding/decoding: gzip module at level 9 vs FrameCodec
+
+Run: python -m benchmarks.blaze_frame
+"""
+import base64
+import gzip
+import uuid
+
+from mixinsdk.clients import _blaze
+from mixinsdk.clients._frame import FrameCodec
+from mixinsdk.clients._json import get_default_codec
+
+from ._bench_utils import bench
+
+
+def make_message(text_size: int) -> dict:
+    return {
+        "conversation_id": str(uuid.uuid4()),
+        "recipient_id": str(uuid.uuid4()),
+        "message_id": str(uuid.uuid4()),
+        "category": "PLAIN_TEXT",
+        "data": base64.b64encode(b"Hello, world! " * (text_size // 14)).decode(),
+    }
+
+
+FRAMES = {
+    "ack": _blaze.pack_ack_frame(str(uuid.uuid4())),
+    "text message 1KB": _blaze.pack_create_message_frame(make_message(700)),
+    "text message 16KB": _blaze.pack_create_message_frame(make_message(12000)),
+}
+
+
+def main():
+    json_codec = get_default_codec()
+    codec = FrameCodec(json_codec)
+    for name, frame in FRAMES.items():
+        raw = gzip.compress(json_codec.dumps(frame))
+        print(f"--- {name}, {len(json_codec.dumps(frame))} bytes ---")
+        bench(
+            "outbound: gzip.compress level 9",
+            lambda: gzip.compress(json_codec.dumps(frame)),
+            20000,
+        )
+        bench(
+            f"outbound: FrameCodec, {len(codec.encode(frame))} bytes",
+            lambda: codec.encode(frame),
+            20000,
+        )
+        bench(
+            "inbound: gzip.decompress",
+            lambda: json_codec.loads(gzip.decompress(raw)),
+            20000,
+        )
+        bench("inbound: FrameCodec", lambda: codec.decode(raw), 20000)
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""Signing and message crypto per call: ops/sec and allocations, fixed keys
+
+Module functions parse keys on each call, the cached paths used by clients
+(AuthTokenSigner, PinEncryptor, MessageKeyring of AppConfig) are measured too.
+
+Run: python -m benchmarks.crypto [--save results.json] [--compare baseline.json]
+
+Exits with status 1 if --compare finds a regression.
+"""
+import argparse
+import base64
+import sys
+import uuid
+
+import nacl.bindings
+import nacl.signing
+
+from mixinsdk.clients._message import (
+    decrypt_message_data,
+    encrypt_message_data,
+    parse_message_data,
+)
+from mixinsdk.clients._sign import encrypt_pin, sign_authentication_token
+
+from ._bench_utils import compare_results, make_app_config, measure, save_results
+
+BODY = '{"asset_id":"965e5c6e-434c-3fa9-b780-c50f43cd955c","amount":"0.01"}'
+TEXT = "Hello, this is an encrypted message. " * 8
+STICKER = '{"sticker_id":"0d2b9b3a-8f2c-4e63-9c47-4b5b0c7a1f3e"}'
+SESSION_COUNTS = (1, 10, 100)
+
+
+def make_sessions(count: int) -> list:
+    """Recipient sessions of fixed keys"""
+    sessions = []
+    for i in range(count):
+        key = nacl.signing.SigningKey(bytes([i % 256]) * 32).verify_key
+        curve_pk = nacl.bindings.crypto_sign_ed25519_pk_to_curve25519(bytes(key))
+        sessions.append(
+            {
+                "user_id": str(uuid.UUID(int=i)),
+                "session_id": str(uuid.UUID(int=i + 1)),
+                "public_key": base64.urlsafe_b64encode(curve_pk).decode(),
+            }
+        )
+    return sessions
+
+
+def run_sign(results: dict):
+    for key_algorithm, number in [("Ed25519", 2000), ("RS512", 20)]:
+        cfg = make_app_config(key_algorithm, fixed=True)
+
+        def sign():
+            sign_authentication_token(
+                cfg.client_id,
+                cfg.session_id,
+                cfg.private_key,
+                cfg.key_algorithm,
+                "POST",
+                "/transfers",
+                BODY,
+            )
+
+        def encrypt():
+            encrypt_pin(
+                cfg.pin,
+                cfg.pin_token,
+                cfg.private_key,
+                cfg.key_algorithm,
+                cfg.session_id,
+            )
+
+        results[f"sign_authentication_token {key_algorithm}"] = measure(
+            f"sign_authentication_token {key_algorithm}", sign, number
+        )
+        results[f"encrypt_pin {key_algorithm}"] = measure(
+            f"encrypt_pin {key_algorithm}", encrypt, number
+        )
+
+        signer = cfg.auth_token_signer
+        name = f"AuthTokenSigner.sign {key_algorithm}"
+        results[name] = measure(
+            name, lambda: signer.sign("POST", "/transfers", BODY), number
+        )
+        encryptor = cfg.pin_encryptor
+        name = f"PinEncryptor.encrypt {key_algorithm}"
+        results[name] = measure(name, lambda: encryptor.encrypt(cfg.pin), number)
+
+
+def run_message(results: dict):
+    cfg = make_app_config("Ed25519", fixed=True)
+    data = TEXT.encode()
+    for count in SESSION_COUNTS:
+        sessions = make_sessions(count)
+        name = f"encrypt_message_data {count} sessions"
+        results[name] = measure(
+            name,
+            lambda: encrypt_message_data(data, sessions, cfg.private_key),
+            max(10, 1000 // count),
+        )
+        name = f"encrypt_message_data {count} sessions, keyring"
+        results[name] = measure(
+            name,
+            lambda: encrypt_message_data(
+                data, sessions, cfg.private_key, cfg.message_keyring
+            ),
+            max(10, 1000 // count),
+        )
+
+    # received data is standard base64, sent to our session
+    pk = nacl.bindings.crypto_sign_ed25519_sk_to_pk(cfg.private_key)
+    curve_pk = nacl.bindings.crypto_sign_ed25519_pk_to_curve25519(pk)
+    ours = {
+        "session_id": cfg.session_id,
+        "public_key": base64.urlsafe_b64encode(curve_pk).decode(),
+    }
+    encrypted = encrypt_message_data(data, make_sessions(9) + [ours], cfg.private_key)
+    encrypted = base64.b64encode(base64.urlsafe_b64decode(encrypted + "==")).decode()
+
+    results["decrypt_message_data"] = measure(
+        "decrypt_message_data",
+        lambda: decrypt_message_data(encrypted, cfg.session_id, cfg.private_key),
+        1000,
+    )
+    results["decrypt_message_data, keyring"] = measure(
+        "decrypt_message_data, keyring",
+        lambda: decrypt_message_data(
+            encrypted, cfg.session_id, cfg.private_key, cfg.message_keyring
+        ),
+        1000,
+    )
+
+    cases = [
+        ("PLAIN_TEXT", base64.b64encode(data).decode()),
+        ("PLAIN_STICKER", base64.b64encode(STICKER.encode()).decode()),
+        ("ENCRYPTED_TEXT", encrypted),
+    ]
+    for category, data_b64 in cases:
+        name = f"parse_message_data {category}"
+        results[name] = measure(
+            name,
+            lambda: parse_message_data(
+                data_b64, category, cfg.session_id, cfg.private_key
+            ),
+            1000,
+        )
+        if category.startswith("ENCRYPTED_"):
+            name = f"parse_message_data {category}, keyring"
+            results[name] = measure(
+                name,
+                lambda: parse_message_data(
+                    data_b64,
+                    category,
+                    cfg.session_id,
+                    cfg.private_key,
+                    keyring=cfg.message_keyring,
+                ),
+                1000,
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--save", help="save results to this JSON file")
+    parser.add_argument("--compare", help="compare with results of this JSON file")
+    parser.add_argument(
+        "--threshold", type=float, default=0.1, help="regression ratio, default 0.1"
+    )
+    args = parser.parse_args()
+
+    results = {}
+    run_sign(results)
+    run_message(results)
+
+    if args.save:
+        save_results(args.save, results)
+    if args.compare and compare_results(args.compare, results, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
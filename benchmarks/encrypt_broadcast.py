@@ -0,0 +1,82 @@
+"""Encrypt the same message for many conversations:
+one encrypt_message_data() per conversation vs encrypt_message_data_bulk()
+
+Run: python -m benchmarks.encrypt_broadcast
+"""
+import base64
+import os
+import time
+import uuid
+
+import nacl.bindings
+
+from mixinsdk.clients._message import (
+    MessageKeyring,
+    encrypt_message_data,
+    encrypt_message_data_bulk,
+)
+from mixinsdk.clients._sign import generate_ed25519_keypair
+
+from ._bench_utils import make_app_config
+
+SESSIONS_PER_CONVERSATION = 2
+
+
+def make_session() -> dict:
+    pk, _ = generate_ed25519_keypair()
+    curve_pk = nacl.bindings.crypto_sign_ed25519_pk_to_curve25519(pk)
+    return {
+        "user_id": str(uuid.uuid4()),
+        "session_id": str(uuid.uuid4()),
+        "public_key": base64.urlsafe_b64encode(curve_pk).decode(),
+    }
+
+
+def run(name: str, func, conversations: int):
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    print(
+        f"{name:<36} {conversations:>6} conversations"
+        f" {elapsed * 1000:>10.1f} ms {conversations / elapsed:>10,.0f} msgs/sec"
+    )
+
+
+def main():
+    config = make_app_config("Ed25519")
+    data = ("Hello, this is a broadcast message. " * 8).encode()
+    workers = os.cpu_count() or 1
+
+    for count in (10, 100, 1000, 10000):
+        recipients = [
+            [make_session() for _ in range(SESSIONS_PER_CONVERSATION)]
+            for _ in range(count)
+        ]
+
+        def per_conversation():
+            for sessions in recipients:
+                encrypt_message_data(data, sessions, config.private_key)
+
+        keyring = MessageKeyring(config.private_key)
+
+        def per_conversation_keyring():
+            for sessions in recipients:
+                encrypt_message_data(data, sessions, config.private_key, keyring)
+
+        def bulk(max_workers: int, keyring=None):
+            return lambda: encrypt_message_data_bulk(
+                data, recipients, config.private_key, keyring, max_workers
+            )
+
+        run("per conversation", per_conversation, count)
+        run("per conversation, keyring", per_conversation_keyring, count)
+        run("bulk, cold keyring", bulk(1, MessageKeyring(config.private_key)), count)
+        run("bulk, hot keyring", bulk(1, keyring), count)
+        if workers > 1:
+            cold = MessageKeyring(config.private_key)
+            run(f"bulk, cold keyring, threads x {workers}", bulk(workers, cold), count)
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""JSON hot paths under stdlib json and orjson codecs
+
+Run: python -m benchmarks.json_codec
+"""
+import base64
+import gzip
+import uuid
+
+from mixinsdk.clients._json import OrjsonCodec, StdlibJsonCodec
+from mixinsdk.clients._message import parse_message_data
+
+from ._bench_utils import bench
+
+SNAPSHOT = {
+    "type": "snapshot",
+    "snapshot_id": str(uuid.uuid4()),
+    "trace_id": str(uuid.uuid4()),
+    "asset_id": "965e5c6e-434c-3fa9-b780-c50f43cd955c",
+    "opponent_id": str(uuid.uuid4()),
+    "amount": "-0.01000000",
+    "memo": "payout #12345",
+    "created_at": "2022-09-18T08:04:04.073818923Z",
+}
+MESSAGE = {
+    "conversation_id": str(uuid.uuid4()),
+    "recipient_id": str(uuid.uuid4()),
+    "message_id": str(uuid.uuid4()),
+    "category": "PLAIN_TEXT",
+    "data_base64": base64.b64encode(b"Hello, this is a reply message." * 4).decode(),
+}
+ACK_FRAME = {
+    "id": str(uuid.uuid4()),
+    "action": "ACKNOWLEDGE_MESSAGE_RECEIPT",
+    "params": {"message_id": str(uuid.uuid4()), "status": "READ"},
+}
+STICKER_DATA = base64.b64encode(
+    b'{"sticker_id":"f5e9762a-3313-4320-a925-f3598c433102","name":"hi"}'
+).decode()
+
+
+def main():
+    codecs = [StdlibJsonCodec()]
+    try:
+        codecs.append(OrjsonCodec())
+    except ImportError:
+        print("orjson is not installed, only stdlib json is measured\n")
+
+    std = codecs[0]
+    page = std.dumps({"data": [SNAPSHOT] * 500})
+    batch = [MESSAGE] * 100
+    inbound_frame = gzip.compress(
+        std.dumps(
+            {
+                "id": str(uuid.uuid4()),
+                "action": "CREATE_MESSAGE",
+                "data": dict(MESSAGE, data=MESSAGE["data_base64"], user_id="x"),
+            }
+        )
+    )
+
+    for codec in codecs:
+        print(f"--- {codec.name} ---")
+        bench("http: encode batch of 100 messages", lambda: codec.dumps(batch), 2000)
+        bench("http: decode page of 500 snapshots", lambda: codec.loads(page), 500)
+        bench(
+            "blaze: inbound frame (gunzip + decode)",
+            lambda: codec.loads(gzip.decompress(inbound_frame)),
+            20000,
+        )
+        bench(
+            "blaze: outbound ack frame (encode + gzip)",
+            lambda: gzip.compress(codec.dumps(ACK_FRAME)),
+            20000,
+        )
+        bench(
+            "parse_message_data: PLAIN_STICKER",
+            lambda: parse_message_data(STICKER_DATA, "PLAIN_STICKER", "", b"", codec),
+            50000,
+        )
+        print()
+
+
+if __name__ == "__main__":
+    main()
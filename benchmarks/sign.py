@@ -0,0 +1,37 @@
+"""Auth token signing: sign_authentication_token() vs AuthTokenSigner
+
+Run: python -m benchmarks.sign
+"""
+from mixinsdk.clients._sign import sign_authentication_token
+
+from ._bench_utils import bench, make_app_config
+
+BODY = '{"asset_id":"965e5c6e-434c-3fa9-b780-c50f43cd955c","amount":"0.01"}'
+
+
+def main():
+    for key_algorithm, number in [("Ed25519", 5000), ("RS512", 500)]:
+        cfg = make_app_config(key_algorithm)
+        signer = cfg.auth_token_signer
+
+        def old_path():
+            sign_authentication_token(
+                cfg.client_id,
+                cfg.session_id,
+                cfg.private_key,
+                cfg.key_algorithm,
+                "POST",
+                "/transfers",
+                BODY,
+            )
+
+        def new_path():
+            signer.sign("POST", "/transfers", BODY)
+
+        old = bench(f"{key_algorithm} sign_authentication_token", old_path, number)
+        new = bench(f"{key_algorithm} AuthTokenSigner.sign", new_path, number)
+        print(f"{key_algorithm} speedup: {new / old:.1f}x\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -85,5 +85,5 @@ bot = BlazeClient(
     on_message=message_handle,
     on_error=message_handle_error_callback,
 )
-bot.xin = HttpClient_WithAppConfig(cfg)
+bot.xin = HttpClient_WithAppConfig(cfg, session=client.http.session)  # share pool
 bot.run_forever(2)
@@ -0,0 +1,59 @@
+"""asyncio blaze client example"""
+
+import asyncio
+import logging
+
+from mixinsdk.clients.client_blaze_async import AsyncBlazeClient
+from mixinsdk.clients.client_http_async import AsyncHttpClient_WithAppConfig
+from mixinsdk.clients.config import AppConfig
+from mixinsdk.types.message import pack_message, pack_text_data
+
+from ._test_utils import load_app_keystore
+
+logger = logging.getLogger("blaze")
+logger.setLevel(logging.INFO)
+logger.addHandler(logging.StreamHandler())
+
+
+async def message_handle(bot: AsyncBlazeClient, message):
+    action = message["action"]
+
+    if action == "ERROR":
+        logger.warning(message["error"])
+
+    if action != "CREATE_MESSAGE":
+        return
+
+    msg_data = message.get("data", {})
+    category = msg_data.get("category")
+    parsed_data = bot.parse_message_data(msg_data.get("data"), category)
+    logger.info("%s: %s", category, parsed_data)
+
+    reply_text = f"Hi, user {msg_data.get('user_id')}, I had received your {category}"
+    await bot.send_message(
+        pack_message(
+            pack_text_data(reply_text),
+            conversation_id=msg_data.get("conversation_id"),
+            quote_message_id=msg_data.get("message_id"),
+        )
+    )
+    await bot.echo(msg_data.get("message_id"))
+
+
+async def message_handle_error_callback(bot: AsyncBlazeClient, error):
+    logger.error("error: %s", error)
+
+
+async def main():
+    cfg = AppConfig.from_payload(load_app_keystore("mixin-app-keystore.json"))
+    async with AsyncHttpClient_WithAppConfig(cfg) as client:
+        bot = AsyncBlazeClient(
+            cfg,
+            on_message=message_handle,
+            on_error=message_handle_error_callback,
+        )
+        bot.xin = client
+        await bot.run_forever()
+
+
+asyncio.run(main())
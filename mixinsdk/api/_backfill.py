@@ -0,0 +1,100 @@
+"""Fetch all snapshots of a long time range, by shards of time concurrently"""
+import datetime
+import threading
+from functools import partial
+from typing import List, Tuple, Union
+
+from ..utils import parse_rfc3339_to_datetime
+from ._pagination import PageWalker, iter_rows
+
+
+def _to_datetime(value: Union[str, datetime.datetime]) -> datetime.datetime:
+    if isinstance(value, datetime.datetime):
+        if value.tzinfo:
+            value = value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+        return value
+    return parse_rfc3339_to_datetime(value)
+
+
+def split_time_range(
+    start: Union[str, datetime.datetime],
+    end: Union[str, datetime.datetime],
+    shards: int,
+) -> List[Tuple[datetime.datetime, datetime.datetime]]:
+    """Split [start, end) to equal sub ranges"""
+    start, end = _to_datetime(start), _to_datetime(end)
+    if end <= start:
+        raise ValueError("end must be later than start")
+    step = (end - start) / max(1, shards)
+    bounds = [start + step * i for i in range(shards)] + [end]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+class _Progress:
+    def __init__(self, total: int, callback: callable):
+        self.total = total
+        self.callback = callback
+        self.done = 0
+        self.rows = 0
+        self._lock = threading.Lock()
+
+    def shard_done(self, rows_count: int):
+        with self._lock:
+            self.done += 1
+            self.rows += rows_count
+            done, rows = self.done, self.rows
+        if self.callback:
+            self.callback(done, self.total, rows)
+
+
+def backfill(
+    http,
+    fetch: callable,
+    start,
+    end,
+    shards: int = 8,
+    max_workers: int = 4,
+    limit: int = 500,
+    id_field: str = "snapshot_id",
+    on_progress: callable = None,
+):
+    """
+    Walk every shard of [start, end) in ascending order, at most max_workers
+    shards at a time, return rows of all shards, deduplicated by id_field
+    and sorted by created_at.
+
+    - fetch: function, parameters: offset, limit, order; return API response
+    - on_progress: function, 3 arguments: shards_done, shards_total, rows_count
+    - returns list, or coroutine for async clients
+    """
+    ranges = split_time_range(start, end, shards)
+    progress = _Progress(len(ranges), on_progress)
+    fetch = partial(fetch, limit=limit, order="ASC")
+
+    if http.is_async:
+
+        async def collect(shard_start, shard_end):
+            walker = PageWalker(limit, "ASC", shard_end, id_field)
+            rows = [row async for row in iter_rows(http, fetch, shard_start, walker)]
+            progress.shard_done(len(rows))
+            return rows
+
+    else:
+
+        def collect(shard_start, shard_end):
+            walker = PageWalker(limit, "ASC", shard_end, id_field)
+            rows = list(iter_rows(http, fetch, shard_start, walker))
+            progress.shard_done(len(rows))
+            return rows
+
+    def merge(shards_rows):
+        merged = {}
+        for rows in shards_rows:
+            for row in rows:
+                merged.setdefault(row.get(id_field) or id(row), row)
+        return sorted(
+            merged.values(), key=lambda r: parse_rfc3339_to_datetime(r["created_at"])
+        )
+
+    calls = [partial(collect, s, e) for s, e in ranges]
+    return http.pipe(http.gather(calls, max_workers), merge)
@@ -0,0 +1,132 @@
+"""Iterate all rows of list APIs paginated by `offset` (created_at of rows)"""
+import asyncio
+import datetime
+from concurrent.futures import ThreadPoolExecutor
+from typing import Union
+
+from ..types.errors import PaginationError
+from ..utils import format_datetime_to_rfc3339, parse_rfc3339_to_datetime
+
+
+def to_offset(value: Union[str, datetime.datetime, None]):
+    if isinstance(value, datetime.datetime):
+        return format_datetime_to_rfc3339(value)
+    return value
+
+
+class PageWalker:
+    """
+    Cursoring state of a paginated list.
+
+    The offset of next page is `created_at` of the last row,
+    rows of the same time returned again by the next page are skipped,
+    so at most `limit - 1` rows can share one created_at.
+    """
+
+    def __init__(
+        self,
+        limit: int,
+        order: str = "ASC",
+        end=None,
+        id_field: str = "snapshot_id",
+        time_field: str = "created_at",
+    ):
+        """
+        - limit: page size requested, a shorter page is the last page
+        - order: order of rows, "ASC" or "DESC"
+        - end: optional, exclusive end bound of created_at,
+            later than offset for ASC, earlier for DESC
+        """
+        self.limit = limit
+        self.descending = (order or "ASC").upper() == "DESC"
+        end = to_offset(end)
+        self.end = parse_rfc3339_to_datetime(end) if end else None
+        self.id_field = id_field
+        self.time_field = time_field
+        self.finished = False
+        self._boundary_ids = set()  # ids of rows at created_at == next offset
+        self._offset_time: datetime.datetime = None
+
+    def _is_beyond_end(self, t: datetime.datetime) -> bool:
+        if self.end is None:
+            return False
+        return t <= self.end if self.descending else t >= self.end
+
+    def accept(self, rows: list):
+        """Return (rows to yield, offset of next page),
+        set `finished` if no more pages.
+        Raises PaginationError if a full page can't move the offset
+        """
+        result = []
+        boundary_ids = set()
+        last_time = None
+        for row in rows:
+            row_id = row.get(self.id_field)
+            if row_id is not None and row_id in self._boundary_ids:
+                continue
+            t = parse_rfc3339_to_datetime(row[self.time_field])
+            if self._is_beyond_end(t):
+                self.finished = True
+                break
+            if t != last_time:
+                boundary_ids = set()
+                last_time = t
+            if row_id is not None:
+                boundary_ids.add(row_id)
+            result.append(row)
+
+        if len(rows) < self.limit:  # short page
+            self.finished = True
+        if self.finished:
+            return result, None
+        if not result:  # a full page of already seen rows
+            raise PaginationError(
+                f"More than {self.limit} rows at {rows[-1][self.time_field]},"
+                " increase limit"
+            )
+
+        if last_time == self._offset_time:  # offset stays, rows of it are seen
+            boundary_ids |= self._boundary_ids
+        self._boundary_ids = boundary_ids
+        self._offset_time = last_time
+        return result, result[-1][self.time_field]
+
+
+def iter_rows(http, fetch: callable, offset, walker: PageWalker):
+    """
+    Yield rows of all pages, the next page is fetched while
+    the current page is consumed.
+
+    - fetch: function, one parameter: offset, return API response
+    - returns generator, or async generator if http is AsyncHttpRequest
+    """
+    if http.is_async:
+        return _aiter_rows(fetch, to_offset(offset), walker)
+    return _iter_rows(fetch, to_offset(offset), walker)
+
+
+def _iter_rows(fetch, offset, walker: PageWalker):
+    executor = ThreadPoolExecutor(max_workers=1)
+    try:
+        future = executor.submit(fetch, offset)
+        while future:
+            rows, offset = walker.accept(future.result()["data"])
+            future = None if walker.finished else executor.submit(fetch, offset)
+            yield from rows
+    finally:
+        if future:
+            future.cancel()
+        executor.shutdown(wait=False)
+
+
+async def _aiter_rows(fetch, offset, walker: PageWalker):
+    task = asyncio.ensure_future(fetch(offset))
+    try:
+        while task:
+            rows, offset = walker.accept((await task)["data"])
+            task = None if walker.finished else asyncio.ensure_future(fetch(offset))
+            for row in rows:
+                yield row
+    finally:
+        if task:
+            task.cancel()
@@ -1,9 +1,11 @@
-import time
+from functools import partial
 from io import FileIO
 from typing import List, Union
 
 from ..clients._requests import HttpRequest
 
+ACKNOWLEDGEMENTS_LIMIT = 100
+
 
 class MessageApi:
     def __init__(self, http: HttpRequest):
@@ -22,6 +24,23 @@ class MessageApi:
     def send_encrypted_messages(self, messages: list):
         return self._http.post("/encrypted_messages", messages)
 
+    def send_acknowledgements(self, acknowledgements: List[dict]):
+        """
+        - acknowledgements: list of {"message_id": str, "status": "READ"},
+            at most ACKNOWLEDGEMENTS_LIMIT in one request, more are split
+            into concurrent requests
+        - returns list of responses, one per request
+        """
+        calls = [
+            partial(
+                self._http.post,
+                "/acknowledgements",
+                acknowledgements[i : i + ACKNOWLEDGEMENTS_LIMIT],
+            )
+            for i in range(0, len(acknowledgements), ACKNOWLEDGEMENTS_LIMIT)
+        ]
+        return self._http.gather(calls, max_workers=4)
+
     def create_attachment(self) -> dict:
         """After creating action, then upload the attachment to upload_url,
         and then the attachment_id can be used sending images,
@@ -36,10 +55,12 @@ class MessageApi:
 
     def upload_attachment(self, upload_url: str, file: Union[FileIO, bytes]):
         """use create_attachment() to get upload_url"""
-        import httpx
-
         headers = {}
         headers["Content-Type"] = "application/octet-stream"
         headers["x-amz-acl"] = "public-read"
 
-        return httpx.put(upload_url, data=file, headers=headers)
+        # upload through the client's connection pool
+        if self._http.is_async and not isinstance(file, bytes):
+            file = file.read()  # httpx.AsyncClient can't stream a sync file
+        # a file is streamed by the sync client, not read into memory
+        return self._http.session.put(upload_url, content=file, headers=headers)
@@ -1,4 +1,10 @@
+import datetime
+from functools import partial
+from typing import Union
+
 from ..clients._requests import HttpRequest
+from ._backfill import backfill
+from ._pagination import PageWalker, iter_rows
 
 
 class NetworkApi:
@@ -74,6 +80,66 @@ class NetworkApi:
 
         return self._http.get("/network/snapshots", params)
 
+    def iter_snapshots(
+        self,
+        offset: Union[str, datetime.datetime] = None,
+        end: Union[str, datetime.datetime] = None,
+        limit: int = 500,
+        order: str = "ASC",
+        asset_id: str = None,
+    ):
+        """Iterate public snapshots of all pages, one by one.
+            The next page is fetched while the current page is consumed.
+
+        Parameters:
+            - offset: start time, RFC3339Nano string or UTC datetime
+            - end: optional, stop at this time (exclusive),
+                later than offset for `ASC` order, earlier for `DESC`
+            - others: same as get_snapshots_list()
+
+        Returns: generator, or async generator for async clients
+        """
+        fetch = partial(
+            self.get_snapshots_list, limit=limit, asset_id=asset_id, order=order
+        )
+        walker = PageWalker(limit, order, end)
+        return iter_rows(self._http, fetch, offset, walker)
+
+    def backfill_snapshots(
+        self,
+        start: Union[str, datetime.datetime],
+        end: Union[str, datetime.datetime],
+        shards: int = 8,
+        max_workers: int = 4,
+        limit: int = 500,
+        asset_id: str = None,
+        on_progress: callable = None,
+    ):
+        """Get all public snapshots from start to end (exclusive).
+            The time range is split to shards, which are walked concurrently.
+
+        Parameters:
+            - start, end: RFC3339Nano string or UTC datetime
+            - shards: number of time shards
+            - max_workers: max number of shards walked at the same time
+            - on_progress: optional, function,
+                3 arguments: shards_done, shards_total, rows_count
+
+        Returns: list of snapshots deduplicated and sorted by created_at,
+            or coroutine for async clients
+        """
+        fetch = partial(self.get_snapshots_list, asset_id=asset_id)
+        return backfill(
+            self._http,
+            fetch,
+            start,
+            end,
+            shards,
+            max_workers,
+            limit,
+            on_progress=on_progress,
+        )
+
     def get_snapshot(self, snapshot_id):
         """
         Read snapshot details by id.
@@ -130,3 +196,30 @@ class NetworkApi:
             params["destination"] = destination
 
         return self._http.get("/external/transactions", params)
+
+    def iter_pending_deposits(
+        self,
+        offset: Union[str, datetime.datetime] = None,
+        end: Union[str, datetime.datetime] = None,
+        limit: int = 500,
+        asset_id: str = None,
+        destination: str = None,
+    ):
+        """Iterate pending deposits of all pages (in ascending order), one by one.
+            The next page is fetched while the current page is consumed.
+
+        Parameters:
+            - offset: start time, RFC3339Nano string or UTC datetime
+            - end: optional, stop at this time (exclusive)
+            - others: same as get_pending_deposits_list()
+
+        Returns: generator, or async generator for async clients
+        """
+        fetch = partial(
+            self.get_pending_deposits_list,
+            limit=limit,
+            asset_id=asset_id,
+            destination=destination,
+        )
+        walker = PageWalker(limit, "ASC", end, id_field="transaction_id")
+        return iter_rows(self._http, fetch, offset, walker)
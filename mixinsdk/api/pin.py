@@ -1,4 +1,8 @@
+import datetime
+from typing import Union
+
 from ..clients._requests import HttpRequest
+from ._pagination import PageWalker, iter_rows
 
 
 class PinApi:
@@ -46,5 +50,29 @@ class PinApi:
         """
         # - category, Log type, please set to `PIN_INCORRECT`
 
-        params = {"limit": limit, "offset": offset, "category": "PIN_INCORRECT"}
+        params = {"limit": limit, "category": "PIN_INCORRECT"}
+        if offset:
+            params["offset"] = offset
         return self._http.get("/logs", params)
+
+    def iter_error_logs(
+        self,
+        offset: Union[str, datetime.datetime] = None,
+        end: Union[str, datetime.datetime] = None,
+        limit: int = 100,
+    ):
+        """Iterate PIN error logs of all pages (newest first), one by one.
+
+        params:
+        - offset, start time, RFC3339Nano string or UTC datetime
+        - end, optional, stop at this time (exclusive), earlier than offset
+
+        Returns: generator, or async generator for async clients
+        """
+        walker = PageWalker(limit, "DESC", end, id_field="log_id")
+        return iter_rows(
+            self._http,
+            lambda offset: self.get_error_logs(limit, offset),
+            offset,
+            walker,
+        )
@@ -1,12 +1,20 @@
 import base64
+from functools import partial
+from typing import List, Optional
 
+from ..clients._cache import TTLCache
 from ..clients._requests import HttpRequest
 from ..clients._sign import generate_ed25519_keypair
+from ..types.user import UserProfile
+
+USERS_FETCH_LIMIT = 100  # max user ids per request of /users/fetch
 
 
 class UserApi:
     def __init__(self, http: HttpRequest):
         self._http = http
+        # cache of resolve_users(), {user_id: UserProfile}
+        self.profile_cache = TTLCache(maxsize=10000, ttl=600)
 
     def get_me(self):
         """
@@ -20,6 +28,42 @@ class UserApi:
     def get_users(self, user_ids: list):
         return self._http.post("/users/fetch", user_ids)
 
+    def resolve_users(
+        self, user_ids: List[str], max_workers: int = 8
+    ) -> List[Optional[UserProfile]]:
+        """
+        Get profiles of any number of users.
+            Duplicate ids are fetched once, uncached ids are fetched
+            in chunks of USERS_FETCH_LIMIT concurrently.
+
+        Returns: list of UserProfile in the order of user_ids,
+            None for users not found
+        """
+        profiles = {}
+        missing = []
+        for user_id in dict.fromkeys(user_ids):
+            profile = self.profile_cache.get(user_id)
+            if profile is None:
+                missing.append(user_id)
+            else:
+                profiles[user_id] = profile
+
+        chunks = [
+            missing[i : i + USERS_FETCH_LIMIT]
+            for i in range(0, len(missing), USERS_FETCH_LIMIT)
+        ]
+        calls = [partial(self.get_users, chunk) for chunk in chunks]
+
+        def merge(responses):
+            for r in responses:
+                for user in r["data"]:
+                    profile = UserProfile.from_dict(user)
+                    self.profile_cache.set(profile.user_id, profile)
+                    profiles[profile.user_id] = profile
+            return [profiles.get(user_id) for user_id in user_ids]
+
+        return self._http.pipe(self._http.gather(calls, max_workers), merge)
+
     def search_user(self, query: str):
         """
         Search user by Mixin ID or Phone Number.
@@ -78,6 +122,8 @@ class UserApi:
         }
         r = self._http.post("/users", payload)
 
-        r["keypair"] = {"public_key": pk_b64, "private_key": sk_b64}
+        def attach_keypair(r):
+            r["keypair"] = {"public_key": pk_b64, "private_key": sk_b64}
+            return r
 
-        return r
+        return self._http.pipe(r, attach_keypair)
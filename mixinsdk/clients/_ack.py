@@ -0,0 +1,60 @@
+import threading
+
+
+class AckBatcher:
+    """
+    Coalesce message acknowledgements, flush them in one batch
+    when max_batch is reached or max_delay seconds after the first one.
+    Thread-safe.
+    """
+
+    def __init__(self, flush_func: callable, max_batch: int = 100, max_delay=0.2):
+        """
+        - flush_func: function, 1 argument: list of {"message_id", "status"}
+        - max_batch: flush when this many acks are pending
+        - max_delay: seconds, flush pending acks at the latest after this delay
+        """
+        self.flush_func = flush_func
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.flushed_batches = 0
+        self.flushed_acks = 0
+
+        self._pending = []
+        self._timer: threading.Timer = None
+        self._lock = threading.Lock()
+
+    def add(self, message_id: str, status: str = "READ"):
+        batch = None
+        with self._lock:
+            self._pending.append({"message_id": message_id, "status": status})
+            if len(self._pending) >= self.max_batch:
+                batch = self._take()
+            elif self._timer is None:
+                self._timer = threading.Timer(self.max_delay, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        if batch:
+            self._flush(batch)
+
+    def flush(self):
+        """Flush pending acks now, e.g. on shutdown or reconnect"""
+        with self._lock:
+            batch = self._take()
+        if batch:
+            self._flush(batch)
+
+    def __len__(self):
+        return len(self._pending)
+
+    def _take(self) -> list:
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        return batch
+
+    def _flush(self, batch: list):
+        self.flush_func(batch)
+        self.flushed_batches += 1
+        self.flushed_acks += len(batch)
@@ -0,0 +1,155 @@
+"""Blaze (websocket) protocol helpers, shared by BlazeClient and AsyncBlazeClient"""
+import asyncio
+import time
+import uuid
+
+try:  # websockets >= 13
+    from websockets.asyncio.client import connect as _ws_connect
+
+    _HEADERS_ARG = "additional_headers"
+except ImportError:  # legacy websockets
+    from websockets import connect as _ws_connect
+
+    _HEADERS_ARG = "extra_headers"
+
+from . import _message
+from ._frame import FrameCodec
+
+SUBPROTOCOLS = ["Mixin-Blaze-1"]
+
+
+def connect(api_base: str, auth_token: str, **kwargs):
+    """Return websockets connect object,
+    use as `async with connect(...) as ws` or `async for ws in connect(...)`
+    """
+    kwargs[_HEADERS_ARG] = {"Authorization": f"Bearer {auth_token}"}
+    return _ws_connect(api_base, subprotocols=SUBPROTOCOLS, **kwargs)
+
+
+class ConnectToken:
+    """
+    Auth token of websocket connecting, signed ahead of its expiry,
+    so reconnecting never waits for signing or uses an expired token.
+    """
+
+    def __init__(self, sign: callable, lifetime: float = 200, refresh_ahead=60):
+        """
+        - sign: function, no argument, returns a new token
+        - lifetime: seconds, token expiry, see AuthTokenSigner
+        - refresh_ahead: seconds, sign a new token this long before expiry
+        """
+        self.sign = sign
+        self.lifetime = lifetime
+        self.refresh_ahead = refresh_ahead
+        self._token = None
+        self._refresh_at = 0
+
+    def get(self) -> str:
+        if self._token is None or time.monotonic() >= self._refresh_at:
+            self.refresh()
+        return self._token
+
+    def refresh(self):
+        self._token = self.sign()
+        self._refresh_at = time.monotonic() + self.lifetime - self.refresh_ahead
+
+    async def keep_fresh(self):
+        """Coroutine, refresh the token in time, until cancelled"""
+        while True:
+            await asyncio.sleep(max(0, self._refresh_at - time.monotonic()))
+            self.refresh()
+
+
+def pack_ack_frame(message_id: str, status: str = "READ") -> dict:
+    """ACKNOWLEDGE_MESSAGE_RECEIPT, tell server the message is received"""
+    return {
+        "id": str(uuid.uuid4()),
+        "action": "ACKNOWLEDGE_MESSAGE_RECEIPT",
+        "params": {"message_id": message_id, "status": status},
+    }
+
+
+def pack_ack_batch_frame(acks: list) -> dict:
+    """ACKNOWLEDGE_MESSAGE_RECEIPTS, acknowledge messages in one frame
+
+    - acks: list of {"message_id", "status"}
+    """
+    return {
+        "id": str(uuid.uuid4()),
+        "action": "ACKNOWLEDGE_MESSAGE_RECEIPTS",
+        "params": {"messages": acks},
+    }
+
+
+def pack_create_message_frame(message: dict) -> dict:
+    """
+    - message, use types.message.pack_message() to make it
+    """
+    return {"id": str(uuid.uuid4()), "action": "CREATE_MESSAGE", "params": message}
+
+
+def pack_list_pending_frame() -> dict:
+    return {"id": str(uuid.uuid4()), "action": "LIST_PENDING_MESSAGES"}
+
+
+def get_message_id(message: dict) -> str:
+    """message_id of a received CREATE_MESSAGE frame, else None"""
+    data = message.get("data")
+    if message.get("action") != "CREATE_MESSAGE" or not isinstance(data, dict):
+        return None
+    return data.get("message_id")
+
+
+def decode_frame(
+    raw_msg: bytes,
+    frame_codec: FrameCodec,
+    parse_data=False,
+    session_id: str = None,
+    private_key: bytes = None,
+    keyring: _message.MessageKeyring = None,
+) -> dict:
+    """gunzip and decode a received frame
+
+    - parse_data: also parse message data (decrypt if ENCRYPTED_*)
+        to message["data"]["data_parsed"], see parse_message_data()
+    - keyring: keys of private_key, `AppConfig.message_keyring`
+    """
+    message = frame_codec.decode(raw_msg)
+    data = message.get("data") if parse_data else None
+    if isinstance(data, dict) and data.get("category"):
+        data["data_parsed"] = _message.parse_message_data(
+            data.get("data"),
+            data["category"],
+            session_id,
+            private_key,
+            frame_codec.json_codec,
+            keyring,
+        )
+    return message
+
+
+# decoding in process pool, the arguments are sent to processes only once
+_decoder_args = ()
+
+
+def init_decoder_process(frame_codec, parse_data, session_id, private_key):
+    """initializer of ProcessPoolExecutor, frame_codec must be picklable"""
+    global _decoder_args
+    keyring = None
+    if parse_data and isinstance(private_key, bytes):  # Ed25519
+        keyring = _message.MessageKeyring(private_key)
+    _decoder_args = (frame_codec, parse_data, session_id, private_key, keyring)
+
+
+def decode_frame_in_process(raw_msg: bytes) -> dict:
+    return decode_frame(raw_msg, *_decoder_args)
+
+
+def get_acked_message_ids(frame: dict) -> list:
+    """message ids acknowledged by a sending frame, empty if it's not an ack"""
+    action = frame.get("action")
+    if action == "ACKNOWLEDGE_MESSAGE_RECEIPT":
+        return [frame["params"]["message_id"]]
+    if action == "ACKNOWLEDGE_MESSAGE_RECEIPTS":
+        return [ack["message_id"] for ack in frame["params"]["messages"]]
+    return []
@@ -0,0 +1,184 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+
+
+class _CachedResponse:
+    __slots__ = ("content", "expire_at", "etag", "last_modified")
+
+    def __init__(self, content: bytes, expire_at, etag=None, last_modified=None):
+        self.content = content
+        self.expire_at = expire_at
+        self.etag = etag
+        self.last_modified = last_modified
+
+
+class ResponseCache:
+    """
+    LRU cache of GET responses with per-endpoint TTL,
+    can be shared by many clients (and threads).
+
+        cache = ResponseCache()
+        client = HttpClient_WithoutAuth(cache=cache)
+        client.api.network.get_chains_list()  # from network
+        client.api.network.get_chains_list()  # from cache
+        cache.invalidate("/network/chains")
+
+    Only paths matching one of the `ttls` patterns are cached.
+    Raw response content is cached, clients parse it on each hit,
+    so a caller modifying the returned body doesn't change the cache.
+    Expired responses with ETag/Last-Modified are revalidated
+    by a conditional request, and reused if the server replies 304.
+    """
+
+    DEFAULT_TTLS = (
+        (r"^/network/chains", 3600),
+        (r"^/network/assets/top", 60),
+        (r"^/network/assets/search/", 300),
+        (r"^/network/assets/[^/]+$", 60),
+        (r"^/assets/[^/]+/fee$", 300),
+        (r"^/fiats$", 300),
+    )
+
+    def __init__(self, maxsize: int = 1024, ttls=None):
+        """
+        - maxsize: max number of cached responses, least recently used are evicted
+        - ttls: list of (path regex pattern, seconds), first match wins,
+            DEFAULT_TTLS by default. Don't add user private endpoints
+            if the cache is shared by clients of different users.
+        """
+        self.maxsize = maxsize
+        self._ttls = [
+            (re.compile(p), ttl)
+            for p, ttl in (ttls if ttls is not None else self.DEFAULT_TTLS)
+        ]
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.evictions = 0
+
+    def get_ttl(self, path: str):
+        """Return TTL seconds of path, None if not cacheable"""
+        for pattern, ttl in self._ttls:
+            if pattern.search(path):
+                return ttl
+        return None
+
+    def get(self, key):
+        """Return (fresh content or None, validator headers of the stale entry)"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None, None
+            self._data.move_to_end(key)
+            if entry.expire_at > time.monotonic():
+                self.hits += 1
+                return entry.content, None
+            self.misses += 1
+
+        headers = {}
+        if entry.etag:
+            headers["If-None-Match"] = entry.etag
+        if entry.last_modified:
+            headers["If-Modified-Since"] = entry.last_modified
+        return None, headers or None
+
+    def set(self, key, content: bytes, ttl: float, response_headers=None):
+        response_headers = response_headers or {}
+        entry = _CachedResponse(
+            content,
+            time.monotonic() + ttl,
+            response_headers.get("ETag"),
+            response_headers.get("Last-Modified"),
+        )
+        with self._lock:
+            self._data[key] = entry
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def revalidate(self, key, ttl: float):
+        """Server replied 304, refresh expiry, return the cached content"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            entry.expire_at = time.monotonic() + ttl
+            self.revalidated += 1
+            return entry.content
+
+    def invalidate(self, path_prefix: str = None):
+        """Remove cached responses of paths starting with path_prefix,
+        all if path_prefix is None
+        """
+        with self._lock:
+            if path_prefix is None:
+                self._data.clear()
+                return
+            for key in [k for k in self._data if k[1].startswith(path_prefix)]:
+                del self._data[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._data),
+                "hits": self.hits,
+                "misses": self.misses,
+                "revalidated": self.revalidated,
+                "evictions": self.evictions,
+            }
+
+
+class TTLCache:
+    """Thread-safe LRU cache, items expire after ttl seconds"""
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # {key: (expire_at, value)}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return default
+            if item[0] <= time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def set(self, key, value, ttl: float = None):
+        expire_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expire_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            item = self._data.pop(key, None)
+        return default if item is None else item[1]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": len(self._data), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,160 @@
+"""
+Skip redelivered Blaze messages, by message_id.
+
+Pending messages which are not acked yet are delivered again after reconnect,
+a message is marked as seen before its handler runs (at most once).
+"""
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class MessageDeduplicator:
+    """Thread-safe, in memory, the latest maxsize ids within ttl seconds"""
+
+    def __init__(self, maxsize: int = 100000, ttl: float = 86400):
+        """
+        - ttl: seconds, None to keep ids until evicted by maxsize
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._seen = OrderedDict()  # {message_id: seen_at}
+        self._lock = threading.Lock()
+        self.checked = 0
+        self.duplicates = 0
+
+    def is_duplicate(self, message_id: str) -> bool:
+        """Return True if seen, else mark it as seen and return False"""
+        now = time.monotonic()
+        with self._lock:
+            self.checked += 1
+            seen_at = self._seen.get(message_id)
+            if seen_at is not None and (self.ttl is None or now - seen_at < self.ttl):
+                self.duplicates += 1
+                return True
+            self._seen[message_id] = now
+            self._seen.move_to_end(message_id)
+            while len(self._seen) > self.maxsize:
+                self._seen.popitem(last=False)
+            return False
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._seen),
+                "checked": self.checked,
+                "duplicates": self.duplicates,
+            }
+
+
+class SqliteMessageDeduplicator:
+    """Same as MessageDeduplicator, but ids are kept in a SQLite file,
+    so duplicates are skipped across restarts.
+
+    New ids are committed in batches, ids of the last commit_interval seconds
+    may be lost by a crash, then those messages can be handled again.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        maxsize: int = 1000000,
+        ttl: float = 86400 * 3,
+        commit_size: int = 100,
+        commit_interval: float = 0.5,
+        synchronous: str = "NORMAL",
+    ):
+        """
+        - path: SQLite database file
+        - ttl: seconds, None to keep ids until evicted by maxsize
+        - commit_size: commit when this many new ids are pending
+        - commit_interval: seconds, max delay of committing new ids
+        - synchronous: SQLite synchronous mode, "NORMAL" survives process crash,
+            "FULL" survives power loss and syncs the disk on each commit
+        """
+        if synchronous.upper() not in ("OFF", "NORMAL", "FULL", "EXTRA"):
+            raise ValueError(f"Invalid synchronous mode: {synchronous}")
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.commit_size = commit_size
+        self.commit_interval = commit_interval
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(f"PRAGMA synchronous={synchronous}")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS seen_messages"
+            " (message_id TEXT PRIMARY KEY, seen_at REAL NOT NULL)"
+        )
+        self._db.commit()
+        self._lock = threading.Lock()
+        self._inserts = 0
+        self._uncommitted = 0
+        self._commit_timer: threading.Timer = None
+        self.checked = 0
+        self.duplicates = 0
+
+    def is_duplicate(self, message_id: str) -> bool:
+        """Return True if seen, else mark it as seen and return False"""
+        now = time.time()
+        with self._lock:
+            self.checked += 1
+            row = self._db.execute(
+                "SELECT seen_at FROM seen_messages WHERE message_id = ?",
+                (message_id,),
+            ).fetchone()
+            if row and (self.ttl is None or now - row[0] < self.ttl):
+                self.duplicates += 1
+                return True
+            self._db.execute(
+                "INSERT OR REPLACE INTO seen_messages VALUES (?, ?)", (message_id, now)
+            )
+            self._inserts += 1
+            if self._inserts % 1000 == 0:
+                self._prune(now)
+            self._uncommitted += 1
+            if self._uncommitted >= self.commit_size:
+                self._commit()
+            elif not self._commit_timer:
+                self._commit_timer = threading.Timer(self.commit_interval, self.flush)
+                self._commit_timer.daemon = True
+                self._commit_timer.start()
+            return False
+
+    def flush(self):
+        """Commit pending new ids"""
+        with self._lock:
+            self._commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            size = self._db.execute("SELECT COUNT(*) FROM seen_messages").fetchone()
+            return {
+                "size": size[0],
+                "checked": self.checked,
+                "duplicates": self.duplicates,
+            }
+
+    def close(self):
+        with self._lock:
+            self._commit()
+            self._db.close()
+
+    def _commit(self):
+        if self._commit_timer:
+            self._commit_timer.cancel()
+            self._commit_timer = None
+        if self._uncommitted:
+            self._db.commit()
+            self._uncommitted = 0
+
+    def _prune(self, now: float):
+        if self.ttl is not None:
+            self._db.execute(
+                "DELETE FROM seen_messages WHERE seen_at < ?", (now - self.ttl,)
+            )
+        self._db.execute(
+            "DELETE FROM seen_messages WHERE message_id IN (SELECT message_id"
+            " FROM seen_messages ORDER BY seen_at DESC LIMIT -1 OFFSET ?)",
+            (self.maxsize,),
+        )
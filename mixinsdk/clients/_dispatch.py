@@ -0,0 +1,58 @@
+import threading
+from collections import deque
+from concurrent.futures import Executor, Future
+
+
+class OrderedDispatcher:
+    """
+    Run tasks of the same key one by one in submit order,
+    tasks of different keys in parallel on the executor.
+    Tasks of key None are not ordered.
+    """
+
+    def __init__(self, executor: Executor):
+        self.executor = executor
+        self._queues = {}  # {key: deque of (future, func, args)}, only active keys
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+
+    def submit(self, key, func: callable, *args) -> Future:
+        if key is None:
+            return self.executor.submit(func, *args)
+
+        future = Future()
+        with self._lock:
+            q = self._queues.get(key)
+            if q is not None:  # a task of this key is running, run after it
+                q.append((future, func, args))
+                return future
+            self._queues[key] = deque([(future, func, args)])
+        self.executor.submit(self._run_next, key)
+        return future
+
+    def join(self, timeout=None) -> bool:
+        """Wait until all ordered tasks are done, returns False on timeout"""
+        with self._idle:
+            return self._idle.wait_for(lambda: not self._queues, timeout)
+
+    def _run_next(self, key):
+        # one task per executor job, so a busy key doesn't hold a worker
+        with self._lock:
+            future, func, args = self._queues[key][0]
+
+        if future.set_running_or_notify_cancel():
+            try:
+                result = func(*args)
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+
+        with self._lock:
+            q = self._queues[key]
+            q.popleft()
+            if not q:
+                del self._queues[key]
+                self._idle.notify_all()
+                return
+        self.executor.submit(self._run_next, key)
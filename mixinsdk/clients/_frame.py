@@ -0,0 +1,58 @@
+"""
+Codec of Blaze frames: JSON, in gzip format.
+
+Small frames (acks, most replies) hardly shrink but cost the most CPU
+to compress at the deflate setup, so they are stored in gzip format
+without compression. Larger frames are compressed at a fast level.
+"""
+import struct
+import zlib
+
+from ._json import get_default_codec
+
+_GZIP_HEADER = b"\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff"  # no mtime, unknown OS
+_GZIP_WBITS = 16 + zlib.MAX_WBITS
+_AUTO_WBITS = 32 + zlib.MAX_WBITS  # gzip or zlib header
+_MAX_STORED_BLOCK = 0xFFFF
+
+
+class FrameCodec:
+    def __init__(self, json_codec=None, compress_level=1, min_compress_size=512):
+        """
+        - json_codec: see `_json.py`, orjson if installed by default
+        - compress_level: zlib level, 0 (none) to 9 (best, slowest)
+        - min_compress_size: bytes, smaller frames are stored uncompressed
+        """
+        self.json_codec = json_codec if json_codec else get_default_codec()
+        self.compress_level = compress_level
+        self.min_compress_size = min(min_compress_size, _MAX_STORED_BLOCK + 1)
+
+    def encode(self, msg_obj: dict) -> bytes:
+        return self.compress(self.json_codec.dumps(msg_obj))
+
+    def decode(self, raw_msg: bytes):
+        return self.json_codec.loads(self.decompress(raw_msg))
+
+    def compress(self, data: bytes) -> bytes:
+        size = len(data)
+        if size < self.min_compress_size or self.compress_level == 0:
+            if size <= _MAX_STORED_BLOCK:
+                return _gzip_stored(data)
+        c = zlib.compressobj(self.compress_level, zlib.DEFLATED, _GZIP_WBITS)
+        return c.compress(data) + c.flush()
+
+    def decompress(self, raw_msg: bytes) -> bytes:
+        return zlib.decompress(raw_msg, _AUTO_WBITS)
+
+
+def _gzip_stored(data: bytes) -> bytes:
+    """gzip member of one stored (not compressed) deflate block"""
+    size = len(data)
+    return b"".join(
+        (
+            _GZIP_HEADER,
+            struct.pack("<BHH", 1, size, size ^ 0xFFFF),  # final block, stored
+            data,
+            struct.pack("<II", zlib.crc32(data), size),
+        )
+    )
@@ -0,0 +1,188 @@
+"""
+Durable inbox of received Blaze messages.
+
+A message is written to the inbox before it's acked, and removed when
+its handler is done, so unfinished messages are replayed after a crash.
+Writes are grouped: one transaction (one fsync) per batch of new messages,
+and one per batch of handled messages.
+"""
+import logging
+import queue
+import sqlite3
+import threading
+import time
+
+from ._json import get_default_codec
+
+_STOP = object()
+
+
+class SqliteInbox:
+    """SQLite (WAL mode) inbox, written by one background thread"""
+
+    def __init__(
+        self,
+        path: str,
+        batch_size: int = 500,
+        flush_interval: float = 0.005,
+        synchronous: str = "FULL",
+        json_codec=None,
+    ):
+        """
+        - path: SQLite database file
+        - batch_size: max messages written in one transaction
+        - flush_interval: seconds, max wait to fill a batch
+        - synchronous: SQLite synchronous mode, "FULL" survives power loss,
+            "NORMAL" survives process crash and is faster
+        - json_codec: see `_json.py`, orjson if installed by default
+        """
+        if synchronous.upper() not in ("OFF", "NORMAL", "FULL", "EXTRA"):
+            raise ValueError(f"Invalid synchronous mode: {synchronous}")
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.json_codec = json_codec if json_codec else get_default_codec()
+
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(f"PRAGMA synchronous={synchronous}")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS inbox"
+            " (seq INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " message_id TEXT UNIQUE NOT NULL, message BLOB NOT NULL)"
+        )
+        self._db.commit()
+
+        self._queue = queue.Queue()  # ("put", message_id, message) or ("done", id)
+        self._writer: threading.Thread = None
+        self._on_persisted: callable = None
+        self._on_error: callable = None
+        self.logger = logging.getLogger("blaze-inbox")
+        self.persisted = 0
+        self.done_count = 0
+        self.batches = 0
+        self.errors = 0
+
+    def pending(self) -> list:
+        """Unfinished messages in receiving order, to replay on startup"""
+        rows = self._db.execute("SELECT message FROM inbox ORDER BY seq").fetchall()
+        return [self.json_codec.loads(row[0]) for row in rows]
+
+    def start(self, on_persisted: callable, on_error: callable = None):
+        """
+        - on_persisted: function, 2 arguments: list of newly persisted messages,
+            list of message ids already in the inbox (redelivered).
+            Called by the writer thread after the batch is committed
+        - on_error: function, 1 argument: error:Exception, called by the writer
+            thread when a batch fails; the writer keeps running. New messages
+            of a failed batch are not acked so the server delivers them again,
+            handled ones are deleted in a separate transaction
+        """
+        self._on_persisted = on_persisted
+        self._on_error = on_error
+        self._writer = threading.Thread(
+            target=self._write_forever, name="blaze-inbox", daemon=True
+        )
+        self._writer.start()
+
+    def add(self, message_id: str, message: dict):
+        self._queue.put(("put", message_id, message))
+
+    def done(self, message_id: str):
+        self._queue.put(("done", message_id))
+
+    def flush(self):
+        """Wait until all added messages are written"""
+        self._queue.join()
+
+    def close(self):
+        """Write all queued, then stop the writer and close the database"""
+        if self._writer:
+            self._queue.put(_STOP)
+            self._writer.join()
+            self._writer = None
+        self._db.close()
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize(),
+            "persisted": self.persisted,
+            "done": self.done_count,
+            "batches": self.batches,
+            "errors": self.errors,
+        }
+
+    def _write_forever(self):
+        stopping = False
+        while not stopping:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=timeout) if timeout > 0 else None
+                except queue.Empty:
+                    item = None
+                if item is None:
+                    break
+                batch.append(item)
+                if item is _STOP:
+                    break
+
+            if batch[-1] is _STOP:
+                stopping = True
+            items = [item for item in batch if item is not _STOP]
+            puts = [item[1:] for item in items if item[0] == "put"]
+            done_ids = [item[1] for item in items if item[0] == "done"]
+            try:
+                # new messages first, a redelivered one of done_ids stays known
+                self._write_step("write", self._write_puts, puts)
+                self._write_step("delete", self._delete_done, done_ids)
+                self.batches += 1
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _write_step(self, name: str, func: callable, items: list):
+        """Run func(items) in its own transaction, so a failure of new messages
+        doesn't lose deletes of handled messages, and the reverse
+        """
+        if not items:
+            return
+        try:
+            func(items)
+        except Exception as e:
+            self.errors += 1
+            self.logger.error(f"Failed to {name} inbox batch", exc_info=True)
+            self._report_error(e)
+
+    def _report_error(self, error: Exception):
+        if not self._on_error:
+            return
+        try:
+            self._on_error(error)
+        except Exception:
+            self.logger.error("error from on_error callback", exc_info=True)
+
+    def _write_puts(self, puts: list):
+        persisted = []
+        known_ids = []
+        with self._db:  # one transaction
+            for message_id, message in puts:
+                cursor = self._db.execute(
+                    "INSERT OR IGNORE INTO inbox (message_id, message) VALUES (?, ?)",
+                    (message_id, self.json_codec.dumps(message)),
+                )
+                if cursor.rowcount:
+                    persisted.append(message)
+                else:
+                    known_ids.append(message_id)
+        self.persisted += len(persisted)
+        if self._on_persisted:
+            self._on_persisted(persisted, known_ids)
+
+    def _delete_done(self, done_ids: list):
+        with self._db:  # one transaction
+            self._db.executemany(
+                "DELETE FROM inbox WHERE message_id = ?", [(i,) for i in done_ids]
+            )
+        self.done_count += len(done_ids)
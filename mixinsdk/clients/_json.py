@@ -0,0 +1,51 @@
+"""
+JSON codec of HTTP bodies, Blaze frames and message data.
+
+orjson is used if installed (`pip install orjson`), else the stdlib json.
+Codecs encode to bytes, so request bodies are encoded only once.
+"""
+import json
+from typing import Union
+
+
+class StdlibJsonCodec:
+    name = "json"
+
+    def dumps(self, obj) -> bytes:
+        return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode()
+
+    def loads(self, data: Union[bytes, str]):
+        return json.loads(data)
+
+
+class OrjsonCodec:
+    name = "orjson"
+
+    def __init__(self):
+        import orjson  # raise ImportError if not installed
+
+        self.dumps = orjson.dumps
+        self.loads = orjson.loads
+
+
+_default_codec = None
+
+
+def get_default_codec():
+    """orjson codec if installed, else stdlib json codec"""
+    global _default_codec
+    if _default_codec is None:
+        try:
+            _default_codec = OrjsonCodec()
+        except ImportError:
+            _default_codec = StdlibJsonCodec()
+    return _default_codec
+
+
+def set_default_codec(codec):
+    """
+    - codec: object with methods dumps(obj) -> bytes and loads(bytes or str),
+        e.g. StdlibJsonCodec(), OrjsonCodec()
+    """
+    global _default_codec
+    _default_codec = codec
@@ -1,8 +1,11 @@
 import base64
-import json
-import secrets
+import functools
 import logging
+import secrets
+import threading
 import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Union
 
 import nacl.bindings
@@ -12,13 +15,75 @@ from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
 from mixinsdk.utils import base64_pad_equal_sign
 
 from ..utils import base64_pad_equal_sign
+from ._json import get_default_codec
+
+_HEADER_SIZE = 1 + 2 + 32  # version, sessions count, curve25519 public key
+_SESSION_SIZE = 16 + 16 + 32  # session id, iv, encrypted shared key
+
+
+class MessageKeyring:
+    """
+    Curve25519 keys of an app for encrypted messages, derived once,
+    and LRU cache of shared secrets with peer sessions. Thread-safe.
+    Use `AppConfig.message_keyring`.
+    """
+
+    def __init__(self, private_key: bytes, maxsize: int = 4096):
+        """
+        - private_key: ed25519 private key bytes
+        - maxsize: max number of cached peer shared secrets
+        """
+        self.private_key = nacl.bindings.crypto_sign_ed25519_sk_to_curve25519(
+            private_key
+        )
+        self.public_key = nacl.bindings.crypto_sign_ed25519_pk_to_curve25519(
+            nacl.bindings.crypto_sign_ed25519_sk_to_pk(private_key)
+        )
+        self.maxsize = maxsize
+        self._secrets = OrderedDict()  # {peer curve25519 public key: secret}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def shared_secret(self, peer_public_key: bytes) -> bytes:
+        """scalar multiplication: our curve25519 private key * peer public key"""
+        peer_public_key = bytes(peer_public_key)
+        with self._lock:
+            secret = self._secrets.get(peer_public_key)
+            if secret is not None:
+                self._secrets.move_to_end(peer_public_key)
+                self.hits += 1
+                return secret
+            self.misses += 1
+
+        secret = nacl.bindings.crypto_scalarmult(self.private_key, peer_public_key)
+        with self._lock:
+            self._secrets[peer_public_key] = secret
+            while len(self._secrets) > self.maxsize:
+                self._secrets.popitem(last=False)
+        return secret
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._secrets),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
 
 
 def parse_message_data(
-    data_b64_str: str, category: str, app_session_id: str, app_private_key: bytes
+    data_b64_str: str,
+    category: str,
+    app_session_id: str,
+    app_private_key: bytes,
+    json_codec=None,
+    keyring: MessageKeyring = None,
 ) -> Union[dict, str]:
     """
     - parse message data to str or dict. if category is ENCRYPTED_*, will decrypt message data first.
+    - json_codec: see `_json.py`, orjson if installed by default
+    - keyring: keys of app_private_key, to decrypt
 
     Returns: data_parsed
     """
@@ -26,64 +91,133 @@ def parse_message_data(
         return ""
 
     if category.startswith("ENCRYPTED_"):
-        d = decrypt_message_data(data_b64_str, app_session_id, app_private_key)
+        d = decrypt_message_data(data_b64_str, app_session_id, app_private_key, keyring)
     else:
         d = base64.b64decode(data_b64_str).decode()
 
     if category.endswith(("_TEXT", "_POST")):
         return d
+    json_codec = json_codec if json_codec else get_default_codec()
     try:
-        return json.loads(d)
-    except json.JSONDecodeError:
+        return json_codec.loads(d)
+    except ValueError:  # JSONDecodeError of json and orjson
         logging.error(f"Failed to json decode data_b64_str: {d}")
 
 
-def decrypt_message_data(data_b64_str: str, app_session_id: str, private: bytes):
+def decrypt_message_data(
+    data_b64_str: str,
+    app_session_id: str,
+    private: bytes,
+    keyring: MessageKeyring = None,
+):
+    """
+    - keyring: keys of private, derived from it on each call if not given
+
+    Returns: str, see decrypt_message_bytes() for binary data
+    """
     data_bytes = base64.b64decode(base64_pad_equal_sign(data_b64_str))  # not url safe
-    size = 16 + 48  # length of session id bytes + length of encrypted shared key bytes
-    total = len(data_bytes)
+    return decrypt_message_bytes(data_bytes, app_session_id, private, keyring).decode()
+
+
+def decrypt_message_bytes(
+    data: Union[bytes, bytearray, memoryview],
+    app_session_id: Union[str, bytes],
+    private: bytes,
+    keyring: MessageKeyring = None,
+    out: bytearray = None,
+):
+    """
+    Decrypt base64 decoded message data, without copying it
+
+    - app_session_id: uuid str, or its 16 bytes
+    - keyring: keys of private, derived from it on each call if not given
+    - out: optional buffer to decrypt into, can be reused for many messages.
+        It needs the ciphertext size + 15 bytes (required by update_into()),
+        that is len(data) - 48 - 64 * sessions of the message,
+        so len(data) bytes is always enough
+
+    Returns: bytes, or memoryview of out if out is given
+    """
+    view = memoryview(data)
+    total = len(view)
     # bytes([1]) + session_len + pub_key + session_id + shared_key + nonce + ...data
-    if total < 1 + 2 + 32 + 16 + 48 + 12:
+    if total < _HEADER_SIZE + _SESSION_SIZE + 12 + 16:
         raise ValueError("Invalid message data")
-    session_length = int.from_bytes(data_bytes[1:3], byteorder="little")
-    prefixSize = 35 + session_length * size
-    key = []
-    for i in range(35, prefixSize, size):
-        uid = str(uuid.UUID(bytes=data_bytes[i : i + 16]))
-        if uid == app_session_id:
-            dst = []
-            priv = []
-            pub = []
-            pub = data_bytes[3:35]
-
-            priv = nacl.bindings.crypto_sign_ed25519_sk_to_curve25519(private)
-            dst = nacl.bindings.crypto_scalarmult(priv, pub)
-
-            block_size = 16
-            iv = data_bytes[i + 16 : i + 16 + block_size]
-            key = data_bytes[i + 16 + block_size : i + size]
-            decryptor = Cipher(algorithms.AES(dst), modes.CBC(iv)).decryptor()
-            key = decryptor.update(key)  # do not: + decryptor.finalize()
-            key = key[:16]
-            break
+    session_length = int.from_bytes(view[1:3], byteorder="little")
+    prefix_size = _HEADER_SIZE + session_length * _SESSION_SIZE
+    if prefix_size + 12 + 16 > total:
+        raise ValueError("Invalid message data")
+    if isinstance(app_session_id, str):
+        app_session_id = _session_id_bytes(app_session_id)
 
-    if len(key) != 16:
-        raise ValueError("Invalid key")
+    for i in range(_HEADER_SIZE, prefix_size, _SESSION_SIZE):
+        if view[i : i + 16] == app_session_id:
+            break
+    else:
+        raise ValueError("Invalid key")  # not sent to this session
 
-    encrypted_data = data_bytes[prefixSize + 12 : -16]  # remove nonce and tag
+    if keyring is None:
+        keyring = MessageKeyring(private)
+    dst = keyring.shared_secret(view[3:_HEADER_SIZE])
+    iv = view[i + 16 : i + 32]
+    decryptor = Cipher(algorithms.AES(dst), modes.CBC(iv)).decryptor()
+    key = decryptor.update(view[i + 32 : i + 48])  # do not: + decryptor.finalize()
 
-    nonce = data_bytes[prefixSize : prefixSize + 12]
+    nonce = view[prefix_size : prefix_size + 12]
+    encrypted_data = view[prefix_size + 12 : -16]  # remove nonce and tag
     decryptor = Cipher(algorithms.AES(key), modes.GCM(nonce)).decryptor()
-    plain_text = decryptor.update(encrypted_data)
-    return plain_text.decode()
+    if out is None:
+        return decryptor.update(encrypted_data)
+    # update_into() needs room for one more block
+    needed = len(encrypted_data) + 15
+    if len(out) < needed:
+        raise ValueError(f"Buffer is too small, {needed} bytes needed")
+    size = decryptor.update_into(encrypted_data, out)
+    return memoryview(out)[:size]
+
+
+@functools.lru_cache(maxsize=64)
+def _session_id_bytes(session_id: str) -> bytes:
+    return uuid.UUID(session_id).bytes
 
 
 def encrypt_message_data(
-    data_bytes: bytes, recipient_sessions: List[dict], app_private_key: bytes
+    data_bytes: bytes,
+    recipient_sessions: List[dict],
+    app_private_key: bytes,
+    keyring: MessageKeyring = None,
 ):
     """
     session struct: {user_id:uuid str, session_id:uuid str, public_key:str}
+
+    - keyring: keys of app_private_key, derived from it on each call if not given
+    """
+    return encrypt_message_data_bulk(
+        data_bytes, [recipient_sessions], app_private_key, keyring
+    )[0]
+
+
+def encrypt_message_data_bulk(
+    data_bytes: bytes,
+    recipients: List[List[dict]],
+    app_private_key: bytes,
+    keyring: MessageKeyring = None,
+    max_workers: int = 1,
+) -> List[str]:
+    """
+    Encrypt one payload for many messages, e.g. broadcast to conversations.
+    The payload is encrypted once, only its shared key is encrypted
+    for each recipient session.
+
+    - recipients: list of recipient_sessions (see encrypt_message_data),
+        one per message
+    - keyring: keys of app_private_key, derived from it on each call if not given
+    - max_workers: > 1 to encrypt the shared key for sessions in threads
+
+    Returns: list of encrypted data, in the order of recipients
     """
+    if keyring is None:
+        keyring = MessageKeyring(app_private_key)
 
     shared_key = secrets.token_bytes(16)
     nonce = secrets.token_bytes(12)
@@ -91,43 +225,47 @@ def encrypt_message_data(
     encryptor = Cipher(algorithms.AES(shared_key), modes.GCM(nonce)).encryptor()
     shared_ciphertext = encryptor.update(data_bytes)
     shared_ciphertext += encryptor.finalize() + encryptor.tag  # tag = +16 bytes
+    tail = nonce + shared_ciphertext
 
-    # ed25519 private key -> cureve25519 public key
-    _pk = nacl.bindings.crypto_sign_ed25519_sk_to_pk(app_private_key)
-    curve25519_pubkey = nacl.bindings.crypto_sign_ed25519_pk_to_curve25519(_pk)
+    padding = 16 - len(shared_key) % 16  # = 16
+    shared_key += bytes([padding] * padding)  # length = 32
 
-    # ed25519 private key -> curve25519 private key
-    curve25519_privkey = nacl.bindings.crypto_sign_ed25519_sk_to_curve25519(
-        app_private_key
-    )
+    # bytes([1]) + session_len + pub_key + (session_id + shared_key) * n
+    # + nonce + ...data, written in place
+    buffers = []
+    jobs = []  # (buffer, offset, session)
+    for sessions in recipients:
+        sessions_end = _HEADER_SIZE + len(sessions) * _SESSION_SIZE
+        buf = bytearray(sessions_end + len(tail))
+        buf[0] = 1
+        buf[1:3] = len(sessions).to_bytes(2, byteorder="little")
+        buf[3:_HEADER_SIZE] = keyring.public_key
+        buf[sessions_end:] = tail
+        buffers.append(buf)
+        for i, session in enumerate(sessions):
+            jobs.append((buf, _HEADER_SIZE + i * _SESSION_SIZE, session))
 
-    padding = 16 - len(shared_key) % 16  # = 16
-    pad_text = bytes([padding] * padding)
-    shared_key += pad_text  # length = 32
-
-    sessions_bytes = b""
-    for s in recipient_sessions:
-        client_pub = base64.urlsafe_b64decode(base64_pad_equal_sign(s["public_key"]))
-        p2p_key = nacl.bindings.crypto_scalarmult(curve25519_privkey, client_pub)
-
-        iv = secrets.token_bytes(16)
-        encryptor = Cipher(algorithms.AES(p2p_key), modes.CBC(iv)).encryptor()
-        encrypted_shared_key = iv + encryptor.update(shared_key)
-        encrypted_shared_key += encryptor.finalize()  # length = 48
-
-        id_ = uuid.UUID(s["session_id"]).bytes
-        sessions_bytes += id_ + encrypted_shared_key
-    session_len = len(recipient_sessions).to_bytes(2, byteorder="little")
-
-    result = (
-        bytes([1])
-        + session_len
-        + curve25519_pubkey
-        + sessions_bytes
-        + nonce
-        + shared_ciphertext
-    )
-    encoded = base64.urlsafe_b64encode(result).decode("utf-8")  # must be url safe
-    encoded = encoded.rstrip("=")  # remove padding
-
-    return encoded
+    def encrypt_shared_key(jobs: list):
+        for buf, offset, session in jobs:
+            client_pub = base64.urlsafe_b64decode(
+                base64_pad_equal_sign(session["public_key"])
+            )
+            p2p_key = keyring.shared_secret(client_pub)
+            iv = secrets.token_bytes(16)
+            encryptor = Cipher(algorithms.AES(p2p_key), modes.CBC(iv)).encryptor()
+            buf[offset : offset + 16] = uuid.UUID(session["session_id"]).bytes
+            buf[offset + 16 : offset + 32] = iv
+            buf[offset + 32 : offset + _SESSION_SIZE] = (
+                encryptor.update(shared_key) + encryptor.finalize()
+            )  # length = 32
+
+    if max_workers > 1 and len(jobs) > 1:
+        chunk = -(-len(jobs) // max_workers)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            chunks = [jobs[i : i + chunk] for i in range(0, len(jobs), chunk)]
+            list(executor.map(encrypt_shared_key, chunks))
+    else:
+        encrypt_shared_key(jobs)
+
+    # must be url safe, without padding
+    return [base64.urlsafe_b64encode(buf).decode().rstrip("=") for buf in buffers]
@@ -0,0 +1,195 @@
+"""
+Metrics of Blaze clients: latencies, queue depths and connection counts.
+
+    client.metrics.stats()            # dict snapshot
+    client.metrics.prometheus_text()  # Prometheus text exposition format
+    serve_prometheus(client.metrics, 9100)
+"""
+import datetime
+import math
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from ..utils import parse_rfc3339_to_datetime
+
+LATENCY_BUCKETS = (
+    0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, math.inf
+)  # fmt: skip
+
+
+class Histogram:
+    """Thread-safe histogram of seconds, cumulative buckets like Prometheus"""
+
+    def __init__(self, buckets: tuple = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)  # not cumulative
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        with self._lock:
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self.counts[i] += 1
+                    break
+            self.count += 1
+            self.sum += value
+            if value > self.max:
+                self.max = value
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket of the q quantile, 0 if no data"""
+        with self._lock:
+            rank = q * self.count
+            seen = 0
+            for bound, n in zip(self.buckets, self.counts):
+                seen += n
+                if n and seen >= rank:
+                    return min(bound, self.max)
+            return 0.0
+
+    def snapshot(self) -> dict:
+        avg = self.sum / self.count if self.count else 0.0
+        return {
+            "count": self.count,
+            "avg": avg,
+            "p50": self.quantile(0.5),
+            "p99": self.quantile(0.99),
+            "max": self.max,
+        }
+
+
+class BlazeMetrics:
+    """Collected by a Blaze client, gauges are read when taking a snapshot"""
+
+    COUNTERS = (
+        "received",  # decoded CREATE_MESSAGE frames
+        "submitted",  # tasks submitted to the handler threads
+        "completed",  # tasks done
+        "handled",  # on_message calls
+        "sent",  # frames written to the websocket
+        "dropped",  # frames discarded when the send queue is full
+        "connects",
+        "disconnects",
+        "connect_failures",
+    )
+    HISTOGRAMS = ("receive_delay", "handler_duration", "ack_latency")
+
+    def __init__(self, max_tracked_acks: int = 100000):
+        """
+        - max_tracked_acks: max received messages waiting for ack,
+            tracked for ack latency
+        """
+        self.counters = dict.fromkeys(self.COUNTERS, 0)
+        self.histograms = {name: Histogram() for name in self.HISTOGRAMS}
+        self.gauges = {}  # {name: function returns a number or None}, by the client
+        self.max_tracked_acks = max_tracked_acks
+        self._waiting_acks = OrderedDict()  # {message_id: received at}
+        self._lock = threading.Lock()
+
+    def incr(self, name: str, value: int = 1):
+        with self._lock:
+            self.counters[name] += value
+
+    def message_received(self, message_id: str):
+        now = time.monotonic()
+        with self._lock:
+            self.counters["received"] += 1
+            if message_id:
+                self._waiting_acks[message_id] = now
+                while len(self._waiting_acks) > self.max_tracked_acks:
+                    self._waiting_acks.popitem(last=False)
+
+    def handler_started(self, created_at: str):
+        """Observe delay from message created_at (server time) to now"""
+        if not created_at:
+            return
+        created = parse_rfc3339_to_datetime(created_at)
+        created = created.replace(tzinfo=datetime.timezone.utc).timestamp()
+        self.histograms["receive_delay"].observe(max(0.0, time.time() - created))
+
+    def handler_finished(self, duration: float):
+        self.histograms["handler_duration"].observe(duration)
+        self.incr("handled")
+
+    def acks_sent(self, message_ids: list):
+        now = time.monotonic()
+        with self._lock:
+            received = [self._waiting_acks.pop(i, None) for i in message_ids]
+        for t in received:
+            if t is not None:
+                self.histograms["ack_latency"].observe(now - t)
+
+    def stats(self) -> dict:
+        with self._lock:
+            result = dict(self.counters)
+        result["executor_backlog"] = result["submitted"] - result["completed"]
+        for name, func in self.gauges.items():
+            result[name] = _read_gauge(func)
+        for name, histogram in self.histograms.items():
+            result[name] = histogram.snapshot()
+        return result
+
+    def prometheus_text(self, prefix: str = "mixin_blaze") -> str:
+        lines = []
+        with self._lock:
+            counters = dict(self.counters)
+        for name, value in counters.items():
+            lines.append(f"# TYPE {prefix}_{name}_total counter")
+            lines.append(f"{prefix}_{name}_total {value}")
+        backlog = counters["submitted"] - counters["completed"]
+        lines.append(f"# TYPE {prefix}_executor_backlog gauge")
+        lines.append(f"{prefix}_executor_backlog {backlog}")
+        for name, func in self.gauges.items():
+            value = _read_gauge(func)
+            if value is None:
+                continue
+            lines.append(f"# TYPE {prefix}_{name} gauge")
+            lines.append(f"{prefix}_{name} {value}")
+        for name, h in self.histograms.items():
+            metric = f"{prefix}_{name}_seconds"
+            lines.append(f"# TYPE {metric} histogram")
+            with h._lock:
+                cumulative = 0
+                for bound, n in zip(h.buckets, h.counts):
+                    cumulative += n
+                    le = "+Inf" if bound == math.inf else repr(float(bound))
+                    lines.append(f'{metric}_bucket{{le="{le}"}} {cumulative}')
+                lines.append(f"{metric}_sum {h.sum}")
+                lines.append(f"{metric}_count {h.count}")
+        return "\n".join(lines) + "\n"
+
+
+def _read_gauge(func):
+    try:
+        return func()
+    except Exception:
+        return None
+
+
+def serve_prometheus(metrics: BlazeMetrics, port: int, addr: str = "127.0.0.1"):
+    """Serve metrics.prometheus_text() at any path, in a daemon thread.
+    Returns the ThreadingHTTPServer, call its shutdown() to stop.
+
+    - addr: listen address, localhost by default, "" for all interfaces
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = metrics.prometheus_text().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((addr, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,75 @@
+import asyncio
+import threading
+import time
+
+
+class TokenBucket:
+    """Thread-safe token bucket, refills `rate` tokens per second up to `burst`"""
+
+    def __init__(self, rate: float, burst: float = None):
+        self.rate = rate
+        self.burst = burst if burst else max(rate, 1)
+        self._tokens = self.burst
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Take one token, return seconds to wait before using it"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.burst, self._tokens + (now - self._updated_at) * self.rate
+            )
+            self._updated_at = now
+            self._tokens -= 1  # may go negative, the debt is paid by waiting
+            if self._tokens >= 0:
+                return 0
+            return -self._tokens / self.rate
+
+
+class RateLimiter:
+    """
+    Client side rate limiter, can be shared by many clients (and threads).
+
+        limiter = RateLimiter(rate=20, endpoints={"/users/fetch": (5, 10)})
+        client = HttpClient_WithAppConfig(config, rate_limiter=limiter)
+
+    Requests are matched to the endpoint with the longest path prefix,
+    others use the default rate. No limit if rate is None.
+    """
+
+    def __init__(self, rate: float = None, burst: float = None, endpoints: dict = None):
+        """
+        - rate: default requests per second
+        - burst: default bucket size, rate by default
+        - endpoints: {path_prefix: rate or (rate, burst)}
+        """
+        self._default = TokenBucket(rate, burst) if rate else None
+        self._buckets = {}
+        for prefix, limit in (endpoints or {}).items():
+            if not isinstance(limit, (tuple, list)):
+                limit = (limit, None)
+            self._buckets[prefix] = TokenBucket(*limit)
+        # longest prefix first
+        self._prefixes = sorted(self._buckets, key=len, reverse=True)
+
+    def _get_bucket(self, path: str):
+        for prefix in self._prefixes:
+            if path.startswith(prefix):
+                return self._buckets[prefix]
+        return self._default
+
+    def acquire(self, path: str):
+        """Block until the request to path is allowed"""
+        bucket = self._get_bucket(path)
+        if bucket:
+            delay = bucket.reserve()
+            if delay:
+                time.sleep(delay)
+
+    async def acquire_async(self, path: str):
+        bucket = self._get_bucket(path)
+        if bucket:
+            delay = bucket.reserve()
+            if delay:
+                await asyncio.sleep(delay)
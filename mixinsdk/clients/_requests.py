@@ -1,63 +1,248 @@
-import json
+import asyncio
+import email.utils
+import time
 import uuid
-from typing import Union
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Union
 
 import httpx
 
 from ..types.errors import RequestError, RequestTimeout
+from ._cache import ResponseCache
+from ._json import get_default_codec
+from ._ratelimit import RateLimiter
+from ._retry import RetryPolicy
+from ._singleflight import AsyncSingleFlight, SingleFlight
+from .config import HttpTransportConfig
 
+_TIMEOUT_ERRORS = (httpx.ReadTimeout, httpx.ConnectTimeout, httpx.WriteTimeout)
 
-class HttpRequest:
-    def __init__(self, api_base, get_auth_token: callable):
-        """
-        - get_auth_token, function.
-            three parameters: http_method: str, url: str, bodystring: str
-        """
+
+class _HttpRequestBase:
+    """Request building and response parsing,
+    shared by HttpRequest and AsyncHttpRequest
+    """
+
+    is_async = False
+
+    def __init__(
+        self,
+        api_base,
+        get_auth_token: callable,
+        transport: HttpTransportConfig = None,
+        session=None,
+        retry: RetryPolicy = None,
+        rate_limiter: RateLimiter = None,
+        cache: ResponseCache = None,
+        json_codec=None,
+    ):
         self.api_base = api_base
         self.get_auth_token = get_auth_token
-        self.session = httpx.Client()
+        self.transport = transport if transport else HttpTransportConfig()
+        # a session passed in is shared with other clients, don't close it
+        self._owns_session = session is None
+        self.retry = retry
+        self.rate_limiter = rate_limiter
+        self.cache = cache
+        self.json_codec = json_codec if json_codec else get_default_codec()
+        self._single_flight = None
 
-    def get(self, path, query_params: dict = None, request_id=None, timeout=15):
+    @staticmethod
+    def _get_full_path(path, query_params):
         if query_params:
             params_string = "&".join(f"{k}={v}" for k, v in query_params.items())
             path = f"{path}?{params_string}"
+        return path
 
+    def _prepare(
+        self, method, path, query_params, body_bytes, request_id, extra_headers=None
+    ):
+        path = self._get_full_path(path, query_params)
         url = self.api_base + path
         headers = {"Content-Type": "application/json"}
+        if extra_headers:
+            headers.update(extra_headers)
 
-        auth_token = self.get_auth_token("GET", path, "")
+        # callbacks take str, decoding UTF-8 JSON is lossless so the sent
+        # bytes are signed
+        body_string = body_bytes.decode("utf-8") if body_bytes else ""
+        auth_token = self.get_auth_token(method, path, body_string)
         if auth_token:
             headers["Authorization"] = "Bearer " + auth_token
 
-        request_id = request_id if request_id else str(uuid.uuid4())
         headers["X-Request-Id"] = request_id
 
-        try:
-            r = self.session.get(url, headers=headers, timeout=timeout)
-        except (httpx.ReadTimeout, httpx.ConnectTimeout, httpx.WriteTimeout) as e:
-            raise RequestTimeout(None, str(e)) from None
-        except Exception as e:
-            raise RequestError(1, str(e))
+        return url, headers
+
+    def _get_retry_delay(self, error: RequestError, attempt: int, idempotent: bool):
+        if not self.retry or not idempotent:
+            return None
+        return self.retry.get_delay(error, attempt)
+
+    @staticmethod
+    def _get_flight_key(path, query_params):
+        if not query_params:
+            return path
+        return path, tuple(sorted((k, str(v)) for k, v in query_params.items()))
+
+    @staticmethod
+    def _is_idempotent_post(body) -> bool:
+        # server deduplicates requests by trace_id, e.g. transfers,
+        # but a resent encrypted PIN reuses its iterator and counts as a wrong PIN
+        if not isinstance(body, dict) or "pin" in body:
+            return False
+        return bool(body.get("trace_id"))
+
+    def _parse_response(self, r: httpx.Response):
+        """
+        error response JSON have the key "error",
+        else have any data or empty JSON on success.
+        #
+        example of error response:
+        {
+            "error": {
+                "status": 202,
+                "code": 20118,
+                "description": "Invalid PIN format.",
+            }
+        }
+        """
+        if r.status_code == 304:  # reply of a conditional request
+            return None
 
         try:
-            body_json = r.json()
+            body_json = self.json_codec.loads(r.content)
         except Exception:
             body_json = {}
 
-        if r.status_code != 200:
-            error = body_json.get("error", {})
-            status_code = error.get("code", r.status_code)
-            message = error.get("description", r.reason_phrase)
-            raise RequestError(status_code, message)
-
-        if "error" in body_json:
+        if r.status_code != 200 or "error" in body_json:
             error = body_json.get("error", {})
             status_code = error.get("code", r.status_code)
             message = error.get("description", r.reason_phrase)
-            raise RequestError(status_code, message)
+            raise RequestError(
+                status_code,
+                message,
+                status=error.get("status", r.status_code),
+                retry_after=_parse_retry_after(r.headers.get("Retry-After")),
+            )
 
         return body_json
 
+    def _cache_lookup(self, path, query_params):
+        """Return (cache key, ttl, cached body, validator headers),
+        ttl is None if the path is not cacheable
+        """
+        ttl = self.cache.get_ttl(path) if self.cache else None
+        if ttl is None:
+            return None, None, None, None
+        key = (self.api_base, self._get_full_path(path, query_params))
+        content, validators = self.cache.get(key)
+        return key, ttl, self._parse_cached(content), validators
+
+    def _cache_store(self, key, ttl, body, r: httpx.Response):
+        """Save response, return body, None if should request again"""
+        if r.status_code == 304:
+            return self._parse_cached(self.cache.revalidate(key, ttl))
+        self.cache.set(key, r.content, ttl, r.headers)
+        return body
+
+    def _parse_cached(self, content: bytes):
+        # parsed on each hit, callers may modify the body
+        return None if content is None else self.json_codec.loads(content)
+
+
+def _parse_retry_after(value: str):
+    """Return seconds, value is seconds or HTTP date"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        dt = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, dt.timestamp() - time.time())
+
+
+class HttpRequest(_HttpRequestBase):
+    def __init__(
+        self,
+        api_base,
+        get_auth_token: callable,
+        transport: HttpTransportConfig = None,
+        session: httpx.Client = None,
+        retry: RetryPolicy = None,
+        rate_limiter: RateLimiter = None,
+        single_flight: bool = False,
+        cache: ResponseCache = None,
+        json_codec=None,
+    ):
+        """
+        - get_auth_token, function.
+            three parameters: http_method: str, url: str, body: str
+        - transport: connection pool options, ignored if session is given
+        - session: share one connection pool across many clients,
+            create it by `HttpTransportConfig.create_session()`
+        - retry: retry policy of idempotent requests, no retry by default
+        - rate_limiter: client side rate limiter, can be shared by many clients
+        - single_flight: concurrent identical GET requests (same path and query)
+            share one outgoing request, and get the same result object,
+            so treat results as read-only
+        - cache: response cache of read-mostly endpoints,
+            can be shared by many clients. Each hit returns a new body
+        - json_codec: see `_json.py`, orjson if installed by default
+        """
+        super().__init__(
+            api_base,
+            get_auth_token,
+            transport,
+            session,
+            retry,
+            rate_limiter,
+            cache,
+            json_codec,
+        )
+        self.session = session if session else self.transport.create_session()
+        if single_flight:
+            self._single_flight = SingleFlight()
+        if self.transport.prewarm:
+            self.prewarm()
+
+    def prewarm(self):
+        """Open a connection (DNS, TCP and TLS) before the first API call"""
+        try:
+            self.session.head(self.api_base, timeout=15)
+        except Exception:
+            pass
+
+    def get(self, path, query_params: dict = None, request_id=None, timeout=15):
+        if self._single_flight:
+            return self._single_flight.do(
+                self._get_flight_key(path, query_params),
+                lambda: self._get(path, query_params, request_id, timeout),
+            )
+        return self._get(path, query_params, request_id, timeout)
+
+    def _get(self, path, query_params, request_id, timeout):
+        key, ttl, body, validators = self._cache_lookup(path, query_params)
+        if body is not None:
+            return body
+
+        body, r = self._request(
+            "GET", path, query_params, b"", request_id, timeout, True, validators
+        )
+        if ttl is None:
+            return body
+        body = self._cache_store(key, ttl, body, r)
+        if body is None:  # revalidated entry was evicted meanwhile
+            body, r = self._request(
+                "GET", path, query_params, b"", request_id, timeout, True
+            )
+            self.cache.set(key, r.content, ttl, r.headers)
+        return body
+
     def post(
         self,
         path,
@@ -65,59 +250,282 @@ class HttpRequest:
         query_params: dict = None,
         request_id=None,
         timeout=15,
+        idempotent: bool = None,
     ):
-        if query_params:
-            params_string = "&".join(f"{k}={v}" for k, v in query_params.items())
-            path = f"{path}?{params_string}"
-
-        url = self.api_base + path
-        headers = {"Content-Type": "application/json"}
-        bodystring = json.dumps(body)
-        auth_token = self.get_auth_token("POST", path, bodystring)
-        if auth_token:
-            headers["Authorization"] = "Bearer " + auth_token
+        """
+        - idempotent: allow retry, by default True if body has `trace_id`
+            and no `pin`
+        """
+        if idempotent is None:
+            idempotent = self._is_idempotent_post(body)
+        body_bytes = self.json_codec.dumps(body)
+        body_json, _ = self._request(
+            "POST", path, query_params, body_bytes, request_id, timeout, idempotent
+        )
+        return body_json
 
+    def _request(
+        self,
+        method,
+        path,
+        query_params,
+        body_bytes,
+        request_id,
+        timeout,
+        idempotent,
+        extra_headers=None,
+    ):
+        """Return (body JSON, response)"""
         request_id = request_id if request_id else str(uuid.uuid4())
-        headers["X-Request-Id"] = request_id
+        attempt = 0
+        while True:
+            if self.rate_limiter:
+                self.rate_limiter.acquire(path)
+            try:
+                return self._send(
+                    method,
+                    path,
+                    query_params,
+                    body_bytes,
+                    request_id,
+                    timeout,
+                    extra_headers,
+                )
+            except RequestError as e:
+                delay = self._get_retry_delay(e, attempt, idempotent)
+                if delay is None:
+                    raise
+            time.sleep(delay)
+            attempt += 1
+
+    def _send(
+        self,
+        method,
+        path,
+        query_params,
+        body_bytes,
+        request_id,
+        timeout,
+        extra_headers=None,
+    ):
+        url, headers = self._prepare(
+            method, path, query_params, body_bytes, request_id, extra_headers
+        )
 
         try:
-            r = self.session.post(
-                url, headers=headers, data=bodystring, timeout=timeout
+            r = self.session.request(
+                method,
+                url,
+                headers=headers,
+                content=body_bytes or None,
+                timeout=timeout,
             )
-        except (httpx.ReadTimeout, httpx.ConnectTimeout, httpx.WriteTimeout) as e:
+        except _TIMEOUT_ERRORS as e:
             raise RequestTimeout(None, str(e)) from None
         except Exception as e:
             raise RequestError(1, str(e))
 
+        return self._parse_response(r), r
+
+    def pipe(self, result, func: callable):
+        """Apply func to the result of get()/post(),
+        lets Api classes post-process responses for both sync and async requests.
+        """
+        return func(result)
+
+    def gather(self, calls: List[callable], max_workers: int = 8) -> list:
+        """Run calls (functions without arguments, e.g. Api methods with
+        functools.partial) concurrently in threads, return results in order.
+        """
+        if len(calls) <= 1:
+            return [call() for call in calls]
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(calls))) as executor:
+            return list(executor.map(lambda call: call(), calls))
+
+    def close(self):
+        if self._owns_session:
+            self.session.close()
+
+
+class AsyncHttpRequest(_HttpRequestBase):
+    """Same as HttpRequest, but get() and post() are coroutines"""
+
+    is_async = True
+
+    def __init__(
+        self,
+        api_base,
+        get_auth_token: callable,
+        transport: HttpTransportConfig = None,
+        session: httpx.AsyncClient = None,
+        retry: RetryPolicy = None,
+        rate_limiter: RateLimiter = None,
+        single_flight: bool = False,
+        cache: ResponseCache = None,
+        json_codec=None,
+    ):
+        """
+        - get_auth_token, function.
+            three parameters: http_method: str, url: str, body: str
+        - transport: connection pool options, ignored if session is given
+        - session: share one connection pool across many clients,
+            create it by `HttpTransportConfig.create_async_session()`
+        - retry: retry policy of idempotent requests, no retry by default
+        - rate_limiter: client side rate limiter, can be shared by many clients
+        - single_flight: concurrent identical GET requests (same path and query)
+            share one outgoing request, and get the same result object,
+            so treat results as read-only
+        - cache: response cache of read-mostly endpoints,
+            can be shared by many clients. Each hit returns a new body
+        - json_codec: see `_json.py`, orjson if installed by default
+        """
+        super().__init__(
+            api_base,
+            get_auth_token,
+            transport,
+            session,
+            retry,
+            rate_limiter,
+            cache,
+            json_codec,
+        )
+        self.session = session if session else self.transport.create_async_session()
+        if single_flight:
+            self._single_flight = AsyncSingleFlight()
+
+    async def prewarm(self):
+        """Open a connection (DNS, TCP and TLS) before the first API call"""
         try:
-            body_json = r.json()
+            await self.session.head(self.api_base, timeout=15)
         except Exception:
-            body_json = {}
+            pass
 
-        if r.status_code != 200:
-            error = body_json.get("error", {})
-            status_code = error.get("code", r.status_code)
-            message = error.get("description", r.reason_phrase)
-            raise RequestError(status_code, message)
+    async def get(self, path, query_params: dict = None, request_id=None, timeout=15):
+        if self._single_flight:
+            return await self._single_flight.do(
+                self._get_flight_key(path, query_params),
+                lambda: self._get(path, query_params, request_id, timeout),
+            )
+        return await self._get(path, query_params, request_id, timeout)
 
-        if "error" in body_json:
-            error = body_json.get("error", {})
-            status_code = error.get("code", r.status_code)
-            message = error.get("description", r.reason_phrase)
-            raise RequestError(status_code, message)
+    async def _get(self, path, query_params, request_id, timeout):
+        key, ttl, body, validators = self._cache_lookup(path, query_params)
+        if body is not None:
+            return body
 
-        return body_json
+        body, r = await self._request(
+            "GET", path, query_params, b"", request_id, timeout, True, validators
+        )
+        if ttl is None:
+            return body
+        body = self._cache_store(key, ttl, body, r)
+        if body is None:  # revalidated entry was evicted meanwhile
+            body, r = await self._request(
+                "GET", path, query_params, b"", request_id, timeout, True
+            )
+            self.cache.set(key, r.content, ttl, r.headers)
+        return body
 
+    async def post(
+        self,
+        path,
+        body: Union[dict, list],
+        query_params: dict = None,
+        request_id=None,
+        timeout=15,
+        idempotent: bool = None,
+    ):
         """
-        error response JSON have the key "error",
-        else have any data or empty JSON on success.
-        #
-        example of error response:
-        {
-            "error": {
-                "status": 202,
-                "code": 20118,
-                "description": "Invalid PIN format.",
-            }
-        }
+        - idempotent: allow retry, by default True if body has `trace_id`
+            and no `pin`
+        """
+        if idempotent is None:
+            idempotent = self._is_idempotent_post(body)
+        body_bytes = self.json_codec.dumps(body)
+        body_json, _ = await self._request(
+            "POST", path, query_params, body_bytes, request_id, timeout, idempotent
+        )
+        return body_json
+
+    async def _request(
+        self,
+        method,
+        path,
+        query_params,
+        body_bytes,
+        request_id,
+        timeout,
+        idempotent,
+        extra_headers=None,
+    ):
+        """Return (body JSON, response)"""
+        request_id = request_id if request_id else str(uuid.uuid4())
+        attempt = 0
+        while True:
+            if self.rate_limiter:
+                await self.rate_limiter.acquire_async(path)
+            try:
+                return await self._send(
+                    method,
+                    path,
+                    query_params,
+                    body_bytes,
+                    request_id,
+                    timeout,
+                    extra_headers,
+                )
+            except RequestError as e:
+                delay = self._get_retry_delay(e, attempt, idempotent)
+                if delay is None:
+                    raise
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def _send(
+        self,
+        method,
+        path,
+        query_params,
+        body_bytes,
+        request_id,
+        timeout,
+        extra_headers=None,
+    ):
+        url, headers = self._prepare(
+            method, path, query_params, body_bytes, request_id, extra_headers
+        )
+
+        try:
+            r = await self.session.request(
+                method,
+                url,
+                headers=headers,
+                content=body_bytes or None,
+                timeout=timeout,
+            )
+        except _TIMEOUT_ERRORS as e:
+            raise RequestTimeout(None, str(e)) from None
+        except Exception as e:
+            raise RequestError(1, str(e))
+
+        return self._parse_response(r), r
+
+    async def pipe(self, result, func: callable):
+        """Await the result of get()/post(), then apply func to it"""
+        return func(await result)
+
+    async def gather(self, calls: List[callable], max_workers: int = 8) -> list:
+        """Run calls (functions without arguments, returning awaitables)
+        concurrently, at most max_workers at a time, return results in order.
         """
+        semaphore = asyncio.Semaphore(max_workers)
+
+        async def run(call):
+            async with semaphore:
+                return await call()
+
+        return await asyncio.gather(*(run(call) for call in calls))
+
+    async def aclose(self):
+        if self._owns_session:
+            await self.session.aclose()
@@ -0,0 +1,86 @@
+import random
+from typing import Optional
+
+from ..types.errors import RequestError, RequestTimeout
+
+
+class RetryPolicy:
+    """
+    Retry failed requests with exponential backoff and full jitter.
+
+    Only idempotent requests are retried: GET, and POST which body has `trace_id`
+    and no encrypted `pin` (or called with `idempotent=True`).
+    """
+
+    def __init__(
+        self,
+        max_retries: int = 3,
+        backoff_base: float = 0.5,
+        backoff_max: float = 30.0,
+        retry_statuses: tuple = (429, 500, 502, 503, 504),
+        retry_network_errors: bool = True,
+    ):
+        """
+        - max_retries: retries after the first attempt
+        - backoff_base: seconds, delay upper bound of the first retry,
+            doubles every retry, capped by backoff_max
+        - retry_statuses: HTTP status (or Mixin error status) to retry
+        - retry_network_errors: retry timeouts and connection errors
+        """
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retry_statuses = retry_statuses
+        self.retry_network_errors = retry_network_errors
+
+    def get_delay(self, error: RequestError, attempt: int) -> Optional[float]:
+        """Return seconds to wait before retrying, None if should not retry.
+
+        - attempt: number of retries done, 0 for the first failure
+        """
+        if attempt >= self.max_retries:
+            return None
+
+        if isinstance(error, RequestTimeout) or error.status is None:
+            if not self.retry_network_errors:
+                return None
+        elif error.status not in self.retry_statuses:
+            return None
+
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2**attempt))
+        if error.retry_after is not None:
+            # server knows better, but still cap it and spread clients
+            delay = min(self.backoff_max, error.retry_after) + delay / 2
+        return delay
+
+
+class ReconnectPolicy:
+    """
+    Delays of websocket reconnecting, exponential backoff with jitter and a cap,
+    so a fleet of clients doesn't reconnect in lockstep after an outage.
+    """
+
+    def __init__(
+        self,
+        backoff_base: float = 1.0,
+        backoff_max: float = 60.0,
+        jitter: float = 0.5,
+        stable_after: float = 30.0,
+    ):
+        """
+        - backoff_base: seconds, delay of the first reconnect,
+            doubles every failed reconnect, capped by backoff_max
+        - jitter: 0 to 1, the randomized part of a delay
+        - stable_after: seconds, a connection lasted longer resets the backoff
+        """
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.jitter = jitter
+        self.stable_after = stable_after
+
+    def get_delay(self, attempt: int) -> float:
+        """
+        - attempt: number of reconnects since the last stable connection
+        """
+        delay = min(self.backoff_max, self.backoff_base * 2**attempt)
+        return delay * (1 - self.jitter) + random.uniform(0, delay * self.jitter)
@@ -1,9 +1,12 @@
 import datetime
 import hashlib
+import json
 import os
+import threading
 import time
 import uuid
 from base64 import urlsafe_b64decode, urlsafe_b64encode
+from typing import Union
 
 import jwt
 import nacl.bindings
@@ -13,6 +16,11 @@ from cryptography.hazmat.primitives.asymmetric import ed25519
 from cryptography.hazmat.primitives.asymmetric import padding as _padding
 from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
 
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
 
 def sign_authentication_token(
     user_id,
@@ -57,62 +65,214 @@ def sign_authentication_token(
     return jwt.encode(payload, key, algorithm=alg, headers=jwt_headers)
 
 
+def _b64url(data: bytes) -> bytes:
+    return urlsafe_b64encode(data).rstrip(b"=")
+
+
+class AuthTokenSigner:
+    """
+    Same token as sign_authentication_token(),
+    but the private key is parsed and the JWT header is encoded only once.
+    Create one per config (see `AppConfig.auth_token_signer`) and reuse it.
+    """
+
+    def __init__(self, user_id, session_id, private_key, key_algorithm):
+        """
+        - private_key: PEM string for RS512, Ed25519 private key bytes for EdDSA
+        """
+        if key_algorithm.lower() in ["rs512", "rsa"]:
+            alg = "RS512"
+            if isinstance(private_key, str):
+                private_key = private_key.encode()
+            self._key = serialization.load_pem_private_key(private_key, password=None)
+        elif key_algorithm.lower() in ["eddsa", "ed25519"]:
+            alg = "EdDSA"
+            self._key = ed25519.Ed25519PrivateKey.from_private_bytes(private_key[:32])
+        else:
+            raise ValueError(f"Unsupported key's algorithm: {key_algorithm}")
+
+        self.alg = alg
+        self.user_id = user_id
+        self.session_id = session_id
+        self._header_segment = _b64url(
+            json.dumps({"alg": alg, "typ": "JWT"}, separators=(",", ":")).encode()
+        )
+
+    def sign(self, method: str, uri: str, body: Union[bytes, str] = None) -> str:
+        """
+        - body: request body, bytes as sent, or str (will be UTF-8 encoded)
+        """
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        hashresult = hashlib.sha256((method + uri).encode("utf-8") + (body or b""))
+        now = int(time.time())
+        payload = {
+            "uid": self.user_id,
+            "sid": self.session_id,
+            "iat": now,
+            "exp": now + 200,
+            "jti": str(uuid.uuid4()),
+            "sig": hashresult.hexdigest(),
+            "scp": "FULL",
+        }
+        signing_input = (
+            self._header_segment
+            + b"."
+            + _b64url(json.dumps(payload, separators=(",", ":")).encode())
+        )
+
+        if self.alg == "RS512":
+            signature = self._key.sign(
+                signing_input, _padding.PKCS1v15(), hashes.SHA512()
+            )
+        else:
+            signature = self._key.sign(signing_input)
+
+        return (signing_input + b"." + _b64url(signature)).decode()
+
+
 def encrypt_pin(
     pin, pin_token, private_key, key_algorithm, session_id, iter_string: str = None
 ):
     """Support RS512 and Ed25519 algorithm"""
-    pin_token_bytes = urlsafe_b64decode(pin_token)
+    encryptor = PinEncryptor(pin_token, private_key, key_algorithm, session_id)
+    return encryptor.encrypt(pin, iter_string)
 
-    # Get pin key
-    if key_algorithm == "RS512":
-        # load RSA key from PEM format
-        private_key = serialization.load_pem_private_key(
-            private_key.encode(), password=None
-        )
-        # decrypt
-        pin_key = private_key.decrypt(
-            pin_token_bytes,
-            _padding.OAEP(
-                mgf=_padding.MGF1(algorithm=hashes.SHA256()),
-                algorithm=hashes.SHA256(),
-                label=session_id.encode("utf-8"),
-            ),
-        )
-    elif key_algorithm == "Ed25519":
-        # ed25519 to curve25519
-        curve25519_key = nacl.bindings.crypto_sign_ed25519_sk_to_curve25519(private_key)
-        # scalar multiplication: curve25519_key * public
-        pin_key = nacl.bindings.crypto_scalarmult(curve25519_key, pin_token_bytes)
-    else:
-        raise ValueError(f"Invalid key algorithm: {key_algorithm}")
-
-    # Prepare content to be encrypted
-    pin_bytes = pin.encode("utf-8")
-    be_encrypt = pin_bytes
-    # append timestamp bytes
-    timebytes = int(time.time()).to_bytes(8, "little")  # unix timestamp
-    be_encrypt += timebytes
-    # append iterator bytes
-    if iter_string:
-        iterator_bytes = iter_string.encode("utf-8")
-    else:
-        iterator_bytes = int(time.time() * 1e9).to_bytes(8, "little")  # unix nano
-    be_encrypt += iterator_bytes
-    # append padding bytes
-    block_size = 16
-    padding_num = block_size - len(be_encrypt) % block_size
-    padding_bytes = int.to_bytes(padding_num, 1, "little") * padding_num
-    be_encrypt += padding_bytes
-
-    # Encrypt (use AES-256-CBC)
-    iv = os.urandom(block_size)
-    cipher = Cipher(algorithms.AES(pin_key), modes.CBC(iv))
-    encryptor = cipher.encryptor()
-    ciphertext = encryptor.update(be_encrypt)  # do not: + encryptor.finalize()
-    #
-    encrypted_pin = iv + ciphertext
-    encrypted_pin = urlsafe_b64encode(encrypted_pin).decode()
-    return encrypted_pin
+
+class PinIterator:
+    """
+    Strictly increasing PIN iterators (unix nanoseconds), thread-safe.
+    The server rejects an iterator not greater than the last one used.
+    """
+
+    def __init__(self, path: str = None):
+        """
+        - path: file of the last iterator, shared by processes using the same
+            keystore, locked while issuing one (POSIX only).
+            None to be increasing in this process only
+        """
+        if path and fcntl is None:
+            raise RuntimeError("File locks are not supported on this platform")
+        self.path = path
+        self._last = 0
+        self._lock = threading.Lock()
+        self._file = None
+        self._pid = None  # process of the file, flock is shared with forked ones
+
+    def next(self) -> int:
+        with self._lock:
+            iterator = max(time.time_ns(), self._last + 1)
+            if self.path:
+                iterator = self._next_shared(iterator)
+            self._last = iterator
+            return iterator
+
+    def _next_shared(self, iterator: int) -> int:
+        if self._pid != os.getpid():  # not opened, or opened before fork
+            if self._file is not None:
+                self._file.close()
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            self._file = os.fdopen(fd, "r+b", buffering=0)
+            self._pid = os.getpid()
+        fcntl.flock(self._file, fcntl.LOCK_EX)
+        try:
+            self._file.seek(0)
+            last = self._file.read(8)
+            if len(last) == 8:
+                iterator = max(iterator, int.from_bytes(last, "little") + 1)
+            self._file.seek(0)
+            self._file.write(iterator.to_bytes(8, "little"))
+        finally:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+        return iterator
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+                self._pid = None
+
+
+class PinEncryptor:
+    """
+    Same result as encrypt_pin(), but the PIN key is derived only once,
+    and iterators are from a PinIterator.
+    Create one per config (see `AppConfig.pin_encryptor`) and reuse it.
+    """
+
+    def __init__(
+        self,
+        pin_token,
+        private_key,
+        key_algorithm,
+        session_id,
+        iterator: PinIterator = None,
+    ):
+        """
+        - private_key: PEM string for RS512, Ed25519 private key bytes for Ed25519
+        - iterator: PinIterator, increasing in this process by default
+        """
+        pin_token_bytes = urlsafe_b64decode(pin_token)
+
+        # Get pin key
+        if key_algorithm == "RS512":
+            # load RSA key from PEM format
+            private_key = serialization.load_pem_private_key(
+                private_key.encode(), password=None
+            )
+            # decrypt
+            pin_key = private_key.decrypt(
+                pin_token_bytes,
+                _padding.OAEP(
+                    mgf=_padding.MGF1(algorithm=hashes.SHA256()),
+                    algorithm=hashes.SHA256(),
+                    label=session_id.encode("utf-8"),
+                ),
+            )
+        elif key_algorithm == "Ed25519":
+            # ed25519 to curve25519
+            curve25519_key = nacl.bindings.crypto_sign_ed25519_sk_to_curve25519(
+                private_key
+            )
+            # scalar multiplication: curve25519_key * public
+            pin_key = nacl.bindings.crypto_scalarmult(curve25519_key, pin_token_bytes)
+        else:
+            raise ValueError(f"Invalid key algorithm: {key_algorithm}")
+
+        self._algorithm = algorithms.AES(pin_key)
+        self.iterator = iterator if iterator else PinIterator()
+
+    def encrypt(self, pin: str, iter_string: str = None) -> str:
+        """
+        - iter_string: custom iterator, the next of self.iterator by default
+        """
+        # Prepare content to be encrypted
+        pin_bytes = pin.encode("utf-8")
+        be_encrypt = pin_bytes
+        # append timestamp bytes
+        timebytes = int(time.time()).to_bytes(8, "little")  # unix timestamp
+        be_encrypt += timebytes
+        # append iterator bytes
+        if iter_string:
+            iterator_bytes = iter_string.encode("utf-8")
+        else:
+            iterator_bytes = self.iterator.next().to_bytes(8, "little")  # unix nano
+        be_encrypt += iterator_bytes
+        # append padding bytes
+        block_size = 16
+        padding_num = block_size - len(be_encrypt) % block_size
+        padding_bytes = int.to_bytes(padding_num, 1, "little") * padding_num
+        be_encrypt += padding_bytes
+
+        # Encrypt (use AES-256-CBC)
+        iv = os.urandom(block_size)
+        encryptor = Cipher(self._algorithm, modes.CBC(iv)).encryptor()
+        ciphertext = encryptor.update(be_encrypt)  # do not: + encryptor.finalize()
+        #
+        encrypted_pin = iv + ciphertext
+        encrypted_pin = urlsafe_b64encode(encrypted_pin).decode()
+        return encrypted_pin
 
 
 def generate_ed25519_keypair():
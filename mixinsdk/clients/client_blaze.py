@@ -1,23 +1,28 @@
 import asyncio
-import gzip
-import json
 import logging
+import queue
 import signal
 import sys
+import threading
 import time
-import uuid
-from collections import deque
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
 
 import websockets
-import websockets.client
 
 from mixinsdk.types.user import UserProfile
 
 from ..constants import API_BASE_URLS
+from ..types.errors import SendQueueFull
 from ..utils import get_conversation_id_of_two_users
-from . import _message
-from ._sign import sign_authentication_token
+from . import _blaze, _message
+from ._ack import AckBatcher
+from ._dedup import MessageDeduplicator
+from ._dispatch import OrderedDispatcher
+from ._frame import FrameCodec
+from ._inbox import SqliteInbox
+from ._json import get_default_codec
+from ._metrics import BlazeMetrics
+from ._retry import ReconnectPolicy
 from .config import AppConfig
 
 
@@ -32,11 +37,61 @@ class BlazeClient:
         on_error: callable = None,
         api_base: str = API_BASE_URLS.BLAZE_DEFAULT,
         auto_start_list_pending_message=True,
+        json_codec=None,
+        frame_codec: FrameCodec = None,
+        send_queue_size: int = 10000,
+        backpressure: str = "block",
+        ack_batch_size: int = 1,
+        ack_batch_delay: float = 0.2,
+        ack_flush: callable = None,
+        dispatch_key=None,
+        parse_data=False,
+        decode_processes: int = 0,
+        deduplicator: MessageDeduplicator = None,
+        inbox: SqliteInbox = None,
+        reconnect: ReconnectPolicy = None,
+        on_connected: callable = None,
+        on_disconnected: callable = None,
+        metrics: BlazeMetrics = None,
     ):
         """
         - on_message, function, 2 arguments: blaze_client, message:dict
         - on_error, function, 2 arguments: blaze_client, error:Exception
+        - json_codec: see `_json.py`, orjson if installed by default
+        - frame_codec: see `_frame.py`, compression of frames
+        - deduplicator: see `_dedup.py`, skip (and ack again) CREATE_MESSAGE
+            frames of seen message_id, e.g. redelivered pending messages
+        - inbox: see `_inbox.py`, CREATE_MESSAGE frames are written to it before
+            acked (echo() is not needed), and removed when on_message returns.
+            Unfinished messages are replayed by run_forever() on startup
+        - reconnect: see `_retry.py`, delays of reconnecting
+        - on_connected, function, 1 argument: blaze_client
+        - on_disconnected, function, 2 arguments: blaze_client,
+            error:Exception or None if closed normally
+        - metrics: see `_metrics.py`, latencies, queue depths and connection
+            counts, snapshot by stats()
+        - send_queue_size: capacity of the outbound queue
+        - backpressure: when the outbound queue is full,
+            "block": wait for space, "drop": discard the frame and return False,
+            "raise": raise SendQueueFull
+        - ack_batch_size: > 1 to coalesce echo() acks, flushed in one batch
+            when this many are pending, or ack_batch_delay seconds later
+        - ack_flush: function, 1 argument: list of {"message_id", "status"},
+            to flush batched acks, e.g. HTTP `api.message.send_acknowledgements`,
+            never called on the websocket's loop, so it may block.
+            Default is the websocket ACKNOWLEDGE_MESSAGE_RECEIPTS action
+        - dispatch_key: "conversation_id", "user_id", or function, 1 argument:
+            message:dict, returns the key. Messages of the same key are
+            handled one by one in arrival order, different keys in parallel.
+            Default None, all messages are handled in parallel without order
+        - parse_data: parse message data (decrypt if ENCRYPTED_*) when decoding
+            frames, to message["data"]["data_parsed"]
+        - decode_processes: > 0 to decode frames (gunzip, JSON, parse_data)
+            in a process pool of this size, handlers get the decoded messages.
+            For heavy load on multiple cores, frame_codec must be picklable
         """
+        if backpressure not in ("block", "drop", "raise"):
+            raise ValueError(f"Invalid backpressure policy: {backpressure}")
         self.config = config
         self.profile = profile
 
@@ -45,24 +100,61 @@ class BlazeClient:
         self.logger = logging.getLogger("blaze-client")
         self.api_base = api_base
         self.auto_start_list_pending_message = auto_start_list_pending_message
+        self.json_codec = json_codec if json_codec else get_default_codec()
+        self.frame_codec = frame_codec if frame_codec else FrameCodec(self.json_codec)
+        self.deduplicator = deduplicator
+        self.inbox = inbox
+        self.reconnect = reconnect if reconnect else ReconnectPolicy()
+        self.on_connected = on_connected
+        self.on_disconnected = on_disconnected
+        self._connect_token = _blaze.ConnectToken(
+            lambda: self._get_auth_token("GET", "/", "")
+        )
+
+        self.backpressure = backpressure
+        self.dropped_frames = 0
+        self.ack_batcher: AckBatcher = None
+        if ack_batch_size > 1:
+            self.ack_batcher = AckBatcher(
+                self._flush_acks, max_batch=ack_batch_size, max_delay=ack_batch_delay
+            )
+        self._ack_flush = ack_flush
 
         self.ws = None
+        self.loop: asyncio.AbstractEventLoop = None
         self._stoping = False
-        self._sending_deque = deque()
+        self._sending_queue = queue.Queue(maxsize=send_queue_size)
+        self.dispatch_key = dispatch_key
+        self.parse_data = parse_data
+        self.decode_processes = decode_processes
         self._msg_processors: ThreadPoolExecutor = None
-        self._msg_sender: ThreadPoolExecutor = None
-
-    def _get_auth_token(self, method: str, uri: str, bodystring: str):
-        return sign_authentication_token(
-            self.config.client_id,
-            self.config.session_id,
-            self.config.private_key,
-            self.config.key_algorithm,
-            method,
-            uri,
-            bodystring,
+        self._dispatcher: OrderedDispatcher = None
+        self._decoders: ProcessPoolExecutor = None
+        self._decoding: asyncio.Queue = None  # decoding futures in arrival order
+        self._decoding_task: asyncio.Task = None
+        # created on the websocket's loop
+        self._sender_wakeup: asyncio.Event = None
+        self._sender_task: asyncio.Task = None
+        self._connected: asyncio.Event = None
+        self._stopped: asyncio.Event = None
+        self._loop_thread_id = None
+        # persisted inbox messages are not submitted after handlers shut down
+        self._inbox_lock = threading.Lock()
+        self._inbox_closing = False
+
+        self.metrics = metrics if metrics else BlazeMetrics()
+        self.metrics.gauges.update(
+            send_queue_depth=self._sending_queue.qsize,
+            decoding=lambda: self._decoding.qsize() if self._decoding else 0,
+            acks_pending=lambda: len(self.ack_batcher or ()),
+            inbox_queued=lambda: self.inbox.stats()["queued"] if self.inbox else 0,
+            connected=lambda: int(bool(self._connected and self._connected.is_set())),
+            ping_rtt=lambda: self.ws.latency if self.ws else None,
         )
 
+    def _get_auth_token(self, method: str, uri: str, body: str):
+        return self.config.auth_token_signer.sign(method, uri, body)
+
     def get_conversation_id_with_user(self, user_id: str):
         return get_conversation_id_of_two_users(self.config.client_id, user_id)
 
@@ -71,25 +163,20 @@ class BlazeClient:
         when receive a message, must reply to server
         ACKNOWLEDGE_MESSAGE_RECEIPT ack server received message
         """
-        params = {"message_id": received_msg_id, "status": "READ"}
-        msg = {
-            "id": str(uuid.uuid4()),
-            "action": "ACKNOWLEDGE_MESSAGE_RECEIPT",
-            "params": params,
-        }
-        return self._send(msg)
+        if self.ack_batcher is not None:
+            self.ack_batcher.add(received_msg_id)
+            return True
+        return self._send(_blaze.pack_ack_frame(received_msg_id))
+
+    def stats(self) -> dict:
+        """Snapshot of metrics, histograms in seconds"""
+        return self.metrics.stats()
 
     def send_message(self, message: dict):
         """
         - message, use types.message.pack_message() to make it
         """
-
-        msg = {
-            "id": str(uuid.uuid4()),
-            "action": "CREATE_MESSAGE",
-            "params": message,
-        }
-        return self._send(msg)
+        return self._send(_blaze.pack_create_message_frame(message))
 
     def run_forever(self, max_workers):
         """
@@ -109,30 +196,30 @@ class BlazeClient:
 
         # Multiple threads to handle messages
         self._msg_processors = ThreadPoolExecutor(max_workers=max_workers)
-        # One thread to send message. Websockets not support concurrent
-        self._msg_sender = ThreadPoolExecutor(max_workers=1)
-
-        def sender():
-            self.logger.debug("sender started")
-            while True:
-                if self._stoping:
-                    break
-                if not self._sending_deque:
-                    time.sleep(0.1)
-                    continue
-                if not self.ws:
-                    time.sleep(0.1)
-                    continue
-                msg_obj = self._sending_deque.popleft()
-                raw_msg = gzip.compress(json.dumps(msg_obj).encode())
-                try:
-                    asyncio.run(self.ws.send(raw_msg))
-                except Exception as e:
-                    self.logger.error("Exception occurred", exc_info=True)
-                    self._callback(self.on_error, e)
-            self.logger.debug("sender ended")
-
-        self._msg_sender.submit(sender)
+        if self.dispatch_key:
+            self._dispatcher = OrderedDispatcher(self._msg_processors)
+        if self.decode_processes:
+            self._decoders = ProcessPoolExecutor(
+                max_workers=self.decode_processes,
+                initializer=_blaze.init_decoder_process,
+                initargs=(
+                    self.frame_codec,
+                    self.parse_data,
+                    self.config.session_id,
+                    self.config.private_key,
+                ),
+            )
+
+        if self.inbox is not None:
+            replay = self.inbox.pending()
+            if replay:
+                self.logger.info(f"Replaying {len(replay)} messages of inbox")
+            for message in replay:
+                self._submit(message, replayed=True)
+            self._inbox_closing = False
+            self.inbox.start(
+                self._on_inbox_persisted, lambda e: self._callback(self.on_error, e)
+            )
 
         msg = f"Blaze client ID: {self.config.client_id}"
         self.logger.info(msg)
@@ -149,84 +236,355 @@ class BlazeClient:
             pass
 
         self.logger.debug("Shutting down the threads ...")
+        if self.inbox is not None:
+            self.inbox.flush()
+            with self._inbox_lock:
+                self._inbox_closing = True
+        if self._dispatcher:
+            self._dispatcher.join()
         self._msg_processors.shutdown(wait=True)
-        self._msg_sender.shutdown(wait=True)
+        if self._decoders:
+            self._decoders.shutdown(wait=True)
+        if self.inbox is not None:
+            self.inbox.close()
 
         self.logger.info("Blaze client stopped")
 
     async def _running_loop(self):
-        def _handle_message(raw_msg):
-            message = json.loads(gzip.decompress(raw_msg).decode())
-            self._callback(self.on_message, message)
-
-        def _handle_message_done(future: asyncio.Future):
-            error = future.exception()
-            if error:
-                self._callback(self.on_error, error)
-
-        while True:  # run websocket server forever
-            auth_token = self._get_auth_token("GET", "/", "")
-            async for websocket in websockets.connect(
-                self.api_base,
-                subprotocols=["Mixin-Blaze-1"],
-                extra_headers={"Authorization": f"Bearer {auth_token}"},
-            ):
-                self.logger.info("Websocket connected")
-                self.ws: websockets.client.WebSocketClientProtocol = websocket
-                try:
+        # sender runs on this loop, woken up by _send() of any thread
+        self._loop_thread_id = threading.get_ident()
+        self._connected = asyncio.Event()
+        self._stopped = asyncio.Event()
+        self._sender_wakeup = asyncio.Event()
+        if not self._sending_queue.empty():
+            self._sender_wakeup.set()
+        self._sender_task = asyncio.ensure_future(self._sender())
+        if self._decoders:
+            self._decoding = asyncio.Queue(maxsize=self.decode_processes * 100)
+            self._decoding_task = asyncio.ensure_future(self._dispatch_decoded())
+
+        token_task = asyncio.ensure_future(self._connect_token.keep_fresh())
+        attempt = 0  # reconnects since the last stable connection
+        while not self._stoping:  # run websocket server forever
+            connected_at = None
+            error = None
+            try:
+                token = self._connect_token.get()
+                async with _blaze.connect(self.api_base, token) as websocket:
+                    connected_at = time.monotonic()
+                    self.metrics.incr("connects")
+                    self.logger.info("Websocket connected")
+                    self.ws = websocket
+                    self._connected.set()
+                    self._callback(self.on_connected)
+                    # flush acks before listing pending messages again,
+                    # ack_flush may block (e.g. HTTP), not on this loop
+                    if self.ack_batcher is not None:
+                        await self.loop.run_in_executor(None, self.ack_batcher.flush)
                     if self.auto_start_list_pending_message:
                         self.start_to_list_pending_message()
 
-                    async for raw_msg in self.ws:  # if no message, will be blocking
+                    async for raw_msg in websocket:  # if no message, will be blocking
                         if self._stoping:
                             break
-                        f = self._msg_processors.submit(_handle_message, raw_msg)
-                        f.add_done_callback(_handle_message_done)
-
-                    if self._stoping:
-                        break
-
-                except websockets.ConnectionClosed:
-                    self.logger.warn("websockets.ConnectionClosed")
-                    time.sleep(2)
-                    break  # to recreate websocket connection of new token, else invalid token
-                except Exception as e:
-                    self.logger.error("Exception occurred", exc_info=True)
-                    self._callback(self.on_error, e)
-                    time.sleep(2)
-                    break  # to recreate websocket connection of new token, else invalid token
+                        await self._receive(raw_msg)
+            except websockets.ConnectionClosed as e:
+                if not self._stoping:
+                    self.logger.warning("websockets.ConnectionClosed")
+                    error = e
+            except Exception as e:
+                error = e
+                self.logger.error("Exception occurred", exc_info=True)
+                self._callback(self.on_error, e)
+            finally:
+                self._connected.clear()
             # exited the websocket context, will closed the connection automatically
             self.logger.debug("exited the websocket context")
 
+            if connected_at is None:
+                self.metrics.incr("connect_failures")
+            else:
+                self.metrics.incr("disconnects")
+                self._callback(self.on_disconnected, error)
+                if time.monotonic() - connected_at >= self.reconnect.stable_after:
+                    attempt = 0
             if self._stoping:
                 break  # exit the while loop
 
+            delay = self.reconnect.get_delay(attempt)
+            attempt += 1
+            self.logger.info(f"Reconnecting in {delay:.1f} seconds")
+            try:
+                await asyncio.wait_for(self._stopped.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+        token_task.cancel()
+        if self._decoding_task:
+            await self._decoding.put(None)  # dispatch decoded, then stop
+            await self._decoding_task
+        if not self._sender_task.done():
+            self._sender_task.cancel()
+
+    async def _receive(self, raw_msg: bytes):
+        if self._decoders:
+            # decode in processes, dispatch in arrival order by _dispatch_decoded()
+            decoding = self.loop.run_in_executor(
+                self._decoders, _blaze.decode_frame_in_process, raw_msg
+            )
+            await self._decoding.put(decoding)  # waits if too many in decoding
+        elif self._dispatcher:
+            # decode on the loop thread, to know the key in arrival order
+            try:
+                message = self._decode(raw_msg)
+            except Exception as e:
+                self._callback(self.on_error, e)
+                return
+            self._dispatch(message)
+        else:
+            self.metrics.incr("submitted")
+            f = self._msg_processors.submit(self._handle_raw_message, raw_msg)
+            f.add_done_callback(self._handle_message_done)
+
+    async def _dispatch_decoded(self):
+        while True:
+            decoding = await self._decoding.get()
+            if decoding is None:
+                break
+            try:
+                message = await decoding
+            except Exception as e:
+                self._callback(self.on_error, e)
+                continue
+            self._received(message)
+            self._dispatch(message)
+
+    def _decode(self, raw_msg: bytes) -> dict:
+        message = _blaze.decode_frame(
+            raw_msg,
+            self.frame_codec,
+            self.parse_data,
+            self.config.session_id,
+            self.config.private_key,
+            self.config.message_keyring,
+        )
+        self._received(message)
+        return message
+
+    def _received(self, message: dict):
+        message_id = _blaze.get_message_id(message)
+        if message_id:
+            self.metrics.message_received(message_id)
+
+    def _handle_raw_message(self, raw_msg: bytes):
+        message = self._decode(raw_msg)
+        if not self._to_inbox(message):
+            self._handle_message(message)
+
+    def _handle_message_done(self, future: Future):
+        self.metrics.incr("completed")
+        error = future.exception()
+        if error:
+            self._callback(self.on_error, error)
+
+    def _dispatch(self, message: dict):
+        if not self._to_inbox(message):
+            self._submit(message)
+
+    def _to_inbox(self, message: dict) -> bool:
+        """Write to the inbox, it's acked and submitted after persisted"""
+        if self.inbox is None:
+            return False
+        message_id = _blaze.get_message_id(message)
+        if not message_id:
+            return False
+        self.inbox.add(message_id, message)
+        return True
+
+    def _on_inbox_persisted(self, messages: list, known_ids: list):
+        with self._inbox_lock:
+            if self._inbox_closing:
+                # not acked, replayed by the next run_forever()
+                self.logger.debug(f"{len(messages)} messages left in the inbox")
+                return
+            try:
+                for message in messages:
+                    self.echo(_blaze.get_message_id(message))
+                    self._submit(message)
+                for message_id in known_ids:  # redelivered, handling or handled
+                    self.echo(message_id)
+            except Exception as e:
+                self.logger.error("Exception occurred", exc_info=True)
+                self._callback(self.on_error, e)
+
+    def _submit(self, message: dict, replayed=False):
+        """Run on_message in threads, ordered by dispatch_key if it's set"""
+        if self._dispatcher:
+            try:
+                key = self._get_dispatch_key(message)
+            except Exception as e:
+                self._callback(self.on_error, e)
+                return
+            self.metrics.incr("submitted")
+            f = self._dispatcher.submit(key, self._handle_message, message, replayed)
+        else:
+            self.metrics.incr("submitted")
+            f = self._msg_processors.submit(self._handle_message, message, replayed)
+        f.add_done_callback(self._handle_message_done)
+
+    def _handle_message(self, message: dict, replayed=False):
+        """
+        - replayed: from the inbox, unfinished, so it's not a duplicate
+        """
+        message_id = _blaze.get_message_id(message)
+        try:
+            if self.deduplicator is not None and message_id and not replayed:
+                if self.deduplicator.is_duplicate(message_id):
+                    self.logger.debug(f"Skipped duplicate message {message_id}")
+                    self.echo(message_id)  # ack again, to stop redelivery
+                    return
+            data = message.get("data")
+            if isinstance(data, dict):
+                self._observe(self.metrics.handler_started, data.get("created_at"))
+            started_at = time.monotonic()
+            self._callback(self.on_message, message)
+            self._observe(self.metrics.handler_finished, time.monotonic() - started_at)
+        finally:
+            if self.inbox is not None and message_id:
+                self.inbox.done(message_id)
+
+    def _observe(self, metric: callable, *args):
+        """Errors of metrics are logged, they must not drop messages"""
+        try:
+            metric(*args)
+        except Exception:
+            self.logger.error(f"error from metrics {metric.__name__}", exc_info=True)
+
+    def _get_dispatch_key(self, message: dict):
+        if callable(self.dispatch_key):
+            return self.dispatch_key(message)
+        data = message.get("data")
+        if not isinstance(data, dict):
+            return None  # e.g. replies of sent frames
+        return data.get(self.dispatch_key)
+
+    async def _sender(self):
+        """Send frames of the outbound queue, one sender, websockets not support
+        concurrent sending
+        """
+        self.logger.debug("sender started")
+        while not self._stoping:
+            await self._sender_wakeup.wait()
+            self._sender_wakeup.clear()
+            while True:
+                try:
+                    msg_obj = self._sending_queue.get_nowait()
+                except queue.Empty:
+                    break
+                if not self._connected.is_set():
+                    await self._connected.wait()  # reconnecting
+                raw_msg = self.frame_codec.encode(msg_obj)
+                try:
+                    await self.ws.send(raw_msg)
+                except Exception as e:
+                    self.logger.error("Exception occurred", exc_info=True)
+                    self._callback(self.on_error, e)
+                    continue
+                self.metrics.incr("sent")
+                acked_ids = _blaze.get_acked_message_ids(msg_obj)
+                if acked_ids:
+                    self.metrics.acks_sent(acked_ids)
+        self.logger.debug("sender ended")
+
+    async def _shutdown(self):
+        """Flush the outbound queue if connected, then close the connection"""
+        self._stopped.set()
+        if self._connected.is_set():
+            self._sender_wakeup.set()
+            await asyncio.wait([self._sender_task], timeout=5)
+        self._sender_task.cancel()
+        if self.ws:
+            await self.ws.close()
+
     def parse_message_data(self, data: str, category: str):
         return _message.parse_message_data(
-            data, category, self.config.session_id, self.config.private_key
+            data,
+            category,
+            self.config.session_id,
+            self.config.private_key,
+            self.json_codec,
+            self.config.message_keyring,
         )
 
     def start_to_list_pending_message(self):
         if not self.ws:
             print("✗ Failed to listen, websocket is not connected")
             return
-        msg = {"id": str(uuid.uuid4()), "action": "LIST_PENDING_MESSAGES"}
-        self._send(msg)
+        self._send(_blaze.pack_list_pending_frame())
 
     def close(self, keyboard_interrupt=False):
         self.logger.debug("stoping")
+        if self.ack_batcher is not None:
+            on_loop = threading.get_ident() == self._loop_thread_id
+            if self._ack_flush and on_loop:
+                # may block (e.g. HTTP), the loop must keep running to shut down
+                self.loop.run_in_executor(None, self.ack_batcher.flush)
+            else:
+                self.ack_batcher.flush()  # websocket acks are queued before stop
         self._stoping = True
-        if not keyboard_interrupt:
-            try:
-                asyncio.run(self.ws.close_connection())
-            except Exception:
-                pass
+        if keyboard_interrupt or self._sender_wakeup is None:
+            return
+        if threading.get_ident() == self._loop_thread_id:
+            asyncio.ensure_future(self._shutdown())
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self._shutdown(), self.loop)
+        except RuntimeError:
+            pass  # loop is closed
 
-    def _send(self, msg_obj) -> None:
-        """Add message to sending deque"""
+    def _send(self, msg_obj) -> bool:
+        """Put message to the outbound queue, it's sent on the websocket's loop.
+        Thread-safe. Returns False if not queued.
+        """
         if self._stoping:
-            return
-        self._sending_deque.append(msg_obj)
+            return False
+        on_loop = threading.get_ident() == self._loop_thread_id
+        try:
+            if self.backpressure == "block" and not on_loop:
+                self._sending_queue.put(msg_obj)
+            else:  # never block the loop, it drains the queue
+                self._sending_queue.put_nowait(msg_obj)
+        except queue.Full:
+            if self.backpressure == "drop":
+                self.dropped_frames += 1
+                self.metrics.incr("dropped")
+                self.logger.warning("Sending queue is full, frame dropped")
+                return False
+            raise SendQueueFull(self._sending_queue.maxsize)
+
+        wakeup = self._sender_wakeup
+        # not running yet, or the sender will drain the queue anyway
+        if wakeup is None or wakeup.is_set():
+            return True
+        if on_loop:
+            wakeup.set()
+        else:
+            try:
+                self.loop.call_soon_threadsafe(wakeup.set)
+            except RuntimeError:
+                pass  # loop is closed
+        return True
+
+    def _flush_acks(self, acks: list):
+        try:
+            if self._ack_flush:
+                self._ack_flush(acks)
+                self.metrics.acks_sent([ack["message_id"] for ack in acks])
+            else:
+                self._send(_blaze.pack_ack_batch_frame(acks))
+        except Exception as e:
+            self.logger.error("Failed to flush acks", exc_info=True)
+            self._callback(self.on_error, e)
 
     def _callback(self, callback, *args):
         if callback:
@@ -0,0 +1,312 @@
+"""asyncio version of the Blaze client, runs entirely on one event loop.
+
+    async def on_message(bot, message):
+        ...
+        await bot.echo(message["data"]["message_id"])
+
+    bot = AsyncBlazeClient(config, on_message=on_message)
+    asyncio.run(bot.run_forever())
+
+or, without on_message, iterate received messages:
+
+    async for message in bot.messages():
+        ...
+"""
+
+import asyncio
+import inspect
+import logging
+import time
+
+import websockets
+
+from ..constants import API_BASE_URLS
+from ..types.user import UserProfile
+from ..utils import get_conversation_id_of_two_users
+from . import _blaze, _message
+from ._dedup import MessageDeduplicator, SqliteMessageDeduplicator
+from ._frame import FrameCodec
+from ._json import get_default_codec
+from ._retry import ReconnectPolicy
+from .config import AppConfig
+
+_CLOSED = object()  # end of messages() iteration
+
+
+class AsyncBlazeClient:
+    """WebSocket client with keystore, handlers run as asyncio tasks"""
+
+    def __init__(
+        self,
+        config: AppConfig,
+        profile: UserProfile = None,
+        on_message: callable = None,
+        on_error: callable = None,
+        api_base: str = API_BASE_URLS.BLAZE_DEFAULT,
+        auto_start_list_pending_message=True,
+        max_concurrency: int = 1000,
+        json_codec=None,
+        frame_codec: FrameCodec = None,
+        deduplicator: MessageDeduplicator = None,
+        reconnect: ReconnectPolicy = None,
+        on_connected: callable = None,
+        on_disconnected: callable = None,
+    ):
+        """
+        - on_message, function or coroutine function, 2 arguments:
+            blaze_client, message:dict. If not set, iterate messages()
+        - on_error, function or coroutine function, 2 arguments:
+            blaze_client, error:Exception
+        - max_concurrency: max in-flight on_message handlers,
+            receiving pauses when reached
+        - json_codec: see `_json.py`, orjson if installed by default
+        - frame_codec: see `_frame.py`, compression of frames
+        - deduplicator: see `_dedup.py`, skip (and ack again) CREATE_MESSAGE
+            frames of seen message_id, e.g. redelivered pending messages
+        - reconnect: see `_retry.py`, delays of reconnecting
+        - on_connected, function or coroutine function, 1 argument: blaze_client
+        - on_disconnected, function or coroutine function, 2 arguments:
+            blaze_client, error:Exception or None if closed normally
+        """
+        self.config = config
+        self.profile = profile
+
+        self.on_message = on_message
+        self.on_error = on_error
+        self.logger = logging.getLogger("blaze-client")
+        self.api_base = api_base
+        self.auto_start_list_pending_message = auto_start_list_pending_message
+        self.max_concurrency = max_concurrency
+        self.json_codec = json_codec if json_codec else get_default_codec()
+        self.frame_codec = frame_codec if frame_codec else FrameCodec(self.json_codec)
+        self.deduplicator = deduplicator
+        self.reconnect = reconnect if reconnect else ReconnectPolicy()
+        self.on_connected = on_connected
+        self.on_disconnected = on_disconnected
+        self._connect_token = _blaze.ConnectToken(
+            lambda: self._get_auth_token("GET", "/", "")
+        )
+
+        self.ws = None
+        self._stoping = False
+        self._connected: asyncio.Event = None
+        self._stopped: asyncio.Event = None
+        self._handler_slots: asyncio.Semaphore = None
+        self._handler_tasks = set()
+        self._received: asyncio.Queue = None  # for messages()
+        self._running_task: asyncio.Task = None
+
+    def _get_auth_token(self, method: str, uri: str, body: str):
+        return self.config.auth_token_signer.sign(method, uri, body)
+
+    def get_conversation_id_with_user(self, user_id: str):
+        return get_conversation_id_of_two_users(self.config.client_id, user_id)
+
+    def parse_message_data(self, data: str, category: str):
+        return _message.parse_message_data(
+            data,
+            category,
+            self.config.session_id,
+            self.config.private_key,
+            self.json_codec,
+            self.config.message_keyring,
+        )
+
+    async def echo(self, received_msg_id):
+        """
+        when receive a message, must reply to server
+        ACKNOWLEDGE_MESSAGE_RECEIPT ack server received message
+        """
+        await self._send(_blaze.pack_ack_frame(received_msg_id))
+
+    async def send_message(self, message: dict):
+        """
+        - message, use types.message.pack_message() to make it
+        """
+        await self._send(_blaze.pack_create_message_frame(message))
+
+    async def start_to_list_pending_message(self):
+        await self._send(_blaze.pack_list_pending_frame())
+
+    async def run_forever(self):
+        """
+        Receive messages until close() is called, reconnect if disconnected.
+        Returns after in-flight handlers are done.
+        """
+        self._init_loop_state()
+        self.logger.info(f"Blaze client ID: {self.config.client_id}")
+        try:
+            await self._running_loop()
+        finally:
+            self._connected.clear()
+            self.ws = None
+            if self._handler_tasks:
+                self.logger.debug("Waiting for in-flight handlers ...")
+                await asyncio.gather(*self._handler_tasks, return_exceptions=True)
+            try:
+                self._received.put_nowait(_CLOSED)
+            except asyncio.QueueFull:
+                pass  # messages() stops when the queue is drained
+            self.logger.info("Blaze client stopped")
+
+    async def messages(self):
+        """
+        Async iterator of received messages, when on_message is not set.
+        Starts run_forever() as a task if it's not running.
+        """
+        if self.on_message:
+            raise RuntimeError("messages() is not available when on_message is set")
+        self._init_loop_state()
+        if not self._running_task or self._running_task.done():
+            self._running_task = asyncio.ensure_future(self.run_forever())
+        while True:
+            if self._received.empty() and self._running_task.done():
+                break
+            message = await self._received.get()
+            if message is _CLOSED:
+                break
+            yield message
+
+    async def close(self):
+        self.logger.debug("stoping")
+        self._stoping = True
+        if self._stopped is not None:
+            self._stopped.set()
+        if self.ws:
+            try:
+                await self.ws.close()
+            except Exception:
+                pass
+
+    def _init_loop_state(self):
+        """asyncio objects must be created on the running loop"""
+        if self._connected is not None:
+            return
+        self._connected = asyncio.Event()
+        self._stopped = asyncio.Event()
+        self._handler_slots = asyncio.Semaphore(self.max_concurrency)
+        self._received = asyncio.Queue(maxsize=self.max_concurrency)
+
+    async def _running_loop(self):
+        token_task = asyncio.ensure_future(self._connect_token.keep_fresh())
+        try:
+            await self._connect_forever()
+        finally:
+            token_task.cancel()
+
+    async def _connect_forever(self):
+        attempt = 0  # reconnects since the last stable connection
+        while not self._stoping:  # run websocket forever
+            connected_at = None
+            error = None
+            try:
+                token = self._connect_token.get()
+                async with _blaze.connect(self.api_base, token) as websocket:
+                    connected_at = time.monotonic()
+                    self.logger.info("Websocket connected")
+                    self.ws = websocket
+                    self._connected.set()
+                    await self._callback(self.on_connected)
+                    if self.auto_start_list_pending_message:
+                        await self.start_to_list_pending_message()
+
+                    async for raw_msg in websocket:
+                        if self._stoping:
+                            break
+                        await self._dispatch(raw_msg)
+            except websockets.ConnectionClosed as e:
+                if not self._stoping:
+                    self.logger.warning("websockets.ConnectionClosed")
+                    error = e
+            except Exception as e:
+                error = e
+                self.logger.error("Exception occurred", exc_info=True)
+                await self._callback(self.on_error, e)
+            finally:
+                self._connected.clear()
+                self.ws = None
+
+            if connected_at is not None:
+                await self._callback(self.on_disconnected, error)
+                if time.monotonic() - connected_at >= self.reconnect.stable_after:
+                    attempt = 0
+            if self._stoping:
+                break
+
+            delay = self.reconnect.get_delay(attempt)
+            attempt += 1
+            self.logger.info(f"Reconnecting in {delay:.1f} seconds")
+            try:
+                await asyncio.wait_for(self._stopped.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _dispatch(self, raw_msg: bytes):
+        try:
+            message = self.frame_codec.decode(raw_msg)
+        except Exception as e:
+            await self._callback(self.on_error, e)
+            return
+
+        if self.deduplicator is not None:
+            message_id = _blaze.get_message_id(message)
+            if message_id and await self._is_duplicate(message_id):
+                self.logger.debug(f"Skipped duplicate message {message_id}")
+                await self.echo(message_id)  # ack again, to stop redelivery
+                return
+
+        if not self.on_message:
+            await self._received.put(message)  # blocks receiving while full
+            return
+
+        await self._handler_slots.acquire()  # blocks receiving while full
+        task = asyncio.ensure_future(self._handle_message(message))
+        self._handler_tasks.add(task)
+        task.add_done_callback(self._handler_tasks.discard)
+
+    async def _is_duplicate(self, message_id: str) -> bool:
+        if isinstance(self.deduplicator, SqliteMessageDeduplicator):
+            # file I/O, not on the loop
+            return await asyncio.get_running_loop().run_in_executor(
+                None, self.deduplicator.is_duplicate, message_id
+            )
+        return self.deduplicator.is_duplicate(message_id)
+
+    async def _handle_message(self, message: dict):
+        try:
+            await self._callback(self.on_message, message)
+        finally:
+            self._handler_slots.release()
+
+    async def _send(self, msg_obj) -> None:
+        """Send to websocket, waits if it's reconnecting.
+        Raises websockets.ConnectionClosed if closed while waiting
+        """
+        if self._stoping:
+            return
+        self._init_loop_state()
+        while not self._connected.is_set():
+            waiters = [
+                asyncio.ensure_future(self._connected.wait()),
+                asyncio.ensure_future(self._stopped.wait()),
+            ]
+            try:
+                await asyncio.wait(waiters, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                for waiter in waiters:
+                    waiter.cancel()
+            if self._stoping:
+                raise websockets.ConnectionClosed(None, None)
+        await self.ws.send(self.frame_codec.encode(msg_obj))
+
+    async def _callback(self, callback, *args):
+        if not callback:
+            return
+        try:
+            result = callback(self, *args)
+            if inspect.isawaitable(result):
+                await result
+        except Exception as e:
+            self.logger.error(f"error from callback {callback}: {e}")
+            if self.on_error and callback is not self.on_error:
+                await self._callback(self.on_error, e)
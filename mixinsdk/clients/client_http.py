@@ -1,10 +1,12 @@
 import base64
 import hashlib
 import time
+from functools import partial
 
 from ..constants import API_BASE_URLS
+from ..types.message import MessageDataObject, pack_message
 from ..utils import get_conversation_id_of_two_users
-from . import _message, _requests, _sign
+from . import _message, _requests
 from .config import AppConfig, NetworkUserConfig
 
 
@@ -31,23 +33,25 @@ class HttpClient_WithAppConfig:
             # methods of high-frequency use are assigned to self
             self.send_messages = self.message.send_messages
 
-    def __init__(self, config: AppConfig, api_base: str = API_BASE_URLS.HTTP_DEFAULT):
+    def __init__(
+        self,
+        config: AppConfig,
+        api_base: str = API_BASE_URLS.HTTP_DEFAULT,
+        **http_options,
+    ):
+        """
+        - http_options: passed to HttpRequest, e.g. transport, session
+        """
         self.config = config
-        self.http = _requests.HttpRequest(api_base, self._get_auth_token)
+        self.http = _requests.HttpRequest(
+            api_base, self._get_auth_token, **http_options
+        )
         self.api = self._ApiInterface(self.http, self.get_current_encrypted_pin)
 
         self._conversation_user_sessions = {}  # {id:{expire_at, sessions}}
 
-    def _get_auth_token(self, method: str, uri: str, bodystring: str):
-        return _sign.sign_authentication_token(
-            self.config.client_id,
-            self.config.session_id,
-            self.config.private_key,
-            self.config.key_algorithm,
-            method,
-            uri,
-            bodystring,
-        )
+    def _get_auth_token(self, method: str, uri: str, body: str):
+        return self.config.auth_token_signer.sign(method, uri, body)
 
     def get_conversation_id_with_user(self, user_id: str):
         return get_conversation_id_of_two_users(self.config.client_id, user_id)
@@ -61,34 +65,94 @@ class HttpClient_WithAppConfig:
         """
         if not pin:
             return None
-        cfg = self.config
-        return _sign.encrypt_pin(
-            pin, cfg.pin_token, cfg.private_key, cfg.key_algorithm, cfg.session_id
-        )
+        return self.config.pin_encryptor.encrypt(pin)
 
     def parse_message_data(self, data: str, category: str):
         return _message.parse_message_data(
-            data, category, self.config.session_id, self.config.private_key
+            data,
+            category,
+            self.config.session_id,
+            self.config.private_key,
+            self.http.json_codec,
+            self.config.message_keyring,
         )
 
     def encrypt_message_data(self, b64encoded_data: str, conversation_id: str):
         data_bytes = base64.b64decode(b64encoded_data)
         user_sessions = self.get_conversation_user_sessions(conversation_id)
-
-        recipient_sessions = []
-        for s in user_sessions:
-            # drop self session
-            if s["session_id"] == self.config.session_id:
-                continue
-            recipient_sessions.append(s)
+        recipient_sessions = self._get_recipient_sessions(user_sessions)
 
         encrypted_data = _message.encrypt_message_data(
-            data_bytes, recipient_sessions, self.config.private_key
+            data_bytes,
+            recipient_sessions,
+            self.config.private_key,
+            self.config.message_keyring,
         )
         checksum = self.generate_session_checksum(recipient_sessions)
 
         return encrypted_data, recipient_sessions, checksum
 
+    def pack_encrypted_messages(
+        self, data_obj: MessageDataObject, recipients: list, max_workers: int = 4
+    ) -> list:
+        """
+        Encrypt the same data for many conversations at once,
+        returns messages for `api.message.send_encrypted_messages()`
+        (send at most 100 in one request)
+
+        - data_obj: e.g. types.message.pack_text_data()
+        - recipients: list of (conversation_id, recipient_id)
+        - max_workers: threads to read conversation sessions, and to encrypt
+        """
+        conversation_ids = list(dict.fromkeys(c for c, _ in recipients))
+        calls = [
+            partial(self.get_conversation_user_sessions, c) for c in conversation_ids
+        ]
+        user_sessions = self.http.gather(calls, max_workers=max_workers)
+        user_sessions = dict(zip(conversation_ids, user_sessions))
+        return self._pack_encrypted_messages(
+            data_obj, recipients, user_sessions, max_workers
+        )
+
+    def _pack_encrypted_messages(
+        self,
+        data_obj: MessageDataObject,
+        recipients: list,
+        user_sessions: dict,
+        max_workers: int,
+    ) -> list:
+        """
+        - user_sessions: {conversation_id: sessions}
+        """
+        recipient_sessions = [
+            self._get_recipient_sessions(user_sessions[c]) for c, _ in recipients
+        ]
+        encrypted = _message.encrypt_message_data_bulk(
+            base64.b64decode(data_obj.b64encoded_data),
+            recipient_sessions,
+            self.config.private_key,
+            self.config.message_keyring,
+            max_workers,
+        )
+        messages = []
+        for (conversation_id, recipient_id), sessions, data in zip(
+            recipients, recipient_sessions, encrypted
+        ):
+            result = (data, sessions, self.generate_session_checksum(sessions))
+            messages.append(
+                pack_message(
+                    data_obj,
+                    conversation_id,
+                    recipient_id,
+                    encrypt_func=lambda _data, _conversation_id, r=result: r,
+                )
+            )
+        return messages
+
+    def _get_recipient_sessions(self, user_sessions: list) -> list:
+        # drop self session
+        return [s for s in user_sessions if s["session_id"] != self.config.session_id]
+
     def generate_session_checksum(self, sessions: list[dict]):
         # sort sessions by session_id
         sorted_sessions = sorted(sessions, key=lambda s: s["session_id"])
@@ -141,22 +205,22 @@ class HttpClient_WithNetworkUserConfig:
             self.network = NetworkApi(http)
 
     def __init__(
-        self, config: NetworkUserConfig, api_base: str = API_BASE_URLS.HTTP_DEFAULT
+        self,
+        config: NetworkUserConfig,
+        api_base: str = API_BASE_URLS.HTTP_DEFAULT,
+        **http_options,
     ):
+        """
+        - http_options: passed to HttpRequest, e.g. transport, session
+        """
         self.config = config
-        self.http = _requests.HttpRequest(api_base, self._get_auth_token)
+        self.http = _requests.HttpRequest(
+            api_base, self._get_auth_token, **http_options
+        )
         self.api = self._ApiInterface(self.http, self.get_current_encrypted_pin)
 
-    def _get_auth_token(self, method: str, uri: str, bodystring: str):
-        return _sign.sign_authentication_token(
-            self.config.client_id,
-            self.config.session_id,
-            self.config.private_key,
-            self.config.key_algorithm,
-            method,
-            uri,
-            bodystring,
-        )
+    def _get_auth_token(self, method: str, uri: str, body: str):
+        return self.config.auth_token_signer.sign(method, uri, body)
 
     def get_current_encrypted_pin(self):
         return self.encrypt_pin(self.config.pin)
@@ -167,7 +231,4 @@ class HttpClient_WithNetworkUserConfig:
         """
         if not pin:
             return None
-        cfg = self.config
-        return _sign.encrypt_pin(
-            pin, cfg.pin_token, cfg.private_key, cfg.key_algorithm, cfg.session_id
-        )
+        return self.config.pin_encryptor.encrypt(pin)
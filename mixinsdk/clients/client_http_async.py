@@ -0,0 +1,144 @@
+"""asyncio versions of the HTTP clients.
+
+Api methods are the same as the sync clients, but return coroutines:
+
+    client = AsyncHttpClient_WithAppConfig(config)
+    me = await client.api.user.get_me()
+"""
+
+import asyncio
+import base64
+import time
+from functools import partial
+
+from ..constants import API_BASE_URLS
+from ..types.message import MessageDataObject
+from . import _message, _requests
+from .client_http import HttpClient_WithAppConfig, HttpClient_WithNetworkUserConfig
+from .client_http_nosign import HttpClient_WithoutAuth
+from .config import AppConfig, NetworkUserConfig
+
+
+class _AsyncClientMixin:
+    async def aclose(self):
+        await self.http.aclose()
+
+    async def __aenter__(self):
+        if self.http.transport.prewarm:
+            await self.http.prewarm()
+        return self
+
+    async def __aexit__(self, *args):
+        await self.aclose()
+
+
+class AsyncHttpClient_WithAppConfig(_AsyncClientMixin, HttpClient_WithAppConfig):
+    def __init__(
+        self,
+        config: AppConfig,
+        api_base: str = API_BASE_URLS.HTTP_DEFAULT,
+        **http_options,
+    ):
+        """
+        - http_options: passed to AsyncHttpRequest, e.g. transport, session
+        """
+        self.config = config
+        self.http = _requests.AsyncHttpRequest(
+            api_base, self._get_auth_token, **http_options
+        )
+        self.api = self._ApiInterface(self.http, self.get_current_encrypted_pin)
+
+        self._conversation_user_sessions = {}  # {id:{expire_at, sessions}}
+
+    async def encrypt_message_data(self, b64encoded_data: str, conversation_id: str):
+        """Coroutine version of HttpClient_WithAppConfig.encrypt_message_data(),
+        pack_message() needs a sync encrypt_func, so call this directly
+        and fill the returned values into the message.
+        """
+        data_bytes = base64.b64decode(b64encoded_data)
+        user_sessions = await self.get_conversation_user_sessions(conversation_id)
+        recipient_sessions = self._get_recipient_sessions(user_sessions)
+
+        encrypted_data = _message.encrypt_message_data(
+            data_bytes,
+            recipient_sessions,
+            self.config.private_key,
+            self.config.message_keyring,
+        )
+        checksum = self.generate_session_checksum(recipient_sessions)
+
+        return encrypted_data, recipient_sessions, checksum
+
+    async def pack_encrypted_messages(
+        self, data_obj: MessageDataObject, recipients: list, max_workers: int = 4
+    ) -> list:
+        """Coroutine version of HttpClient_WithAppConfig.pack_encrypted_messages(),
+        encryption runs in the loop's default executor, not blocking the loop
+        """
+        conversation_ids = list(dict.fromkeys(c for c, _ in recipients))
+        calls = [
+            partial(self.get_conversation_user_sessions, c) for c in conversation_ids
+        ]
+        user_sessions = await self.http.gather(calls, max_workers=max_workers)
+        user_sessions = dict(zip(conversation_ids, user_sessions))
+        pack = partial(
+            self._pack_encrypted_messages,
+            data_obj,
+            recipients,
+            user_sessions,
+            max_workers,
+        )
+        return await asyncio.get_running_loop().run_in_executor(None, pack)
+
+    async def get_conversation_user_sessions(self, conversation_id: str):
+        """
+        - conversation_id: str
+        """
+        d = self._conversation_user_sessions.get(conversation_id)
+        if d and d["expire_at"] > time.time():
+            return d["sessions"]
+
+        r = await self.api.conversation.read(conversation_id)
+        sessions = r["data"]["participant_sessions"]
+
+        # cache
+        expire_at = time.time() + 3600  # every hour to read from api again
+        self._conversation_user_sessions[conversation_id] = {
+            "expire_at": expire_at,
+            "sessions": sessions,
+        }
+        return sessions
+
+
+class AsyncHttpClient_WithNetworkUserConfig(
+    _AsyncClientMixin, HttpClient_WithNetworkUserConfig
+):
+    def __init__(
+        self,
+        config: NetworkUserConfig,
+        api_base: str = API_BASE_URLS.HTTP_DEFAULT,
+        **http_options,
+    ):
+        """
+        - http_options: passed to AsyncHttpRequest, e.g. transport, session
+        """
+        self.config = config
+        self.http = _requests.AsyncHttpRequest(
+            api_base, self._get_auth_token, **http_options
+        )
+        self.api = self._ApiInterface(self.http, self.get_current_encrypted_pin)
+
+
+class AsyncHttpClient_WithoutAuth(_AsyncClientMixin, HttpClient_WithoutAuth):
+    """Async HTTP Client without authentication,
+    for convenient access to public Mixin APIs.
+    """
+
+    def __init__(self, api_base: str = API_BASE_URLS.HTTP_DEFAULT, **http_options):
+        """
+        - http_options: passed to AsyncHttpRequest, e.g. transport, session
+        """
+        self.http = _requests.AsyncHttpRequest(
+            api_base, self._get_auth_token, **http_options
+        )
+        self.api = self._ApiInterface(self.http)
@@ -14,8 +14,13 @@ class HttpClient_WithoutAuth:
 
             self.network = NetworkApi(http)
 
-    def __init__(self, api_base: str = API_BASE_URLS.HTTP_DEFAULT):
-        self.http = _requests.HttpRequest(api_base, self._get_auth_token)
+    def __init__(self, api_base: str = API_BASE_URLS.HTTP_DEFAULT, **http_options):
+        """
+        - http_options: passed to HttpRequest, e.g. transport, session
+        """
+        self.http = _requests.HttpRequest(
+            api_base, self._get_auth_token, **http_options
+        )
         self.api = self._ApiInterface(self.http)
 
     def _get_auth_token(self, *args, **kwargs):  # ignore arguments
@@ -29,9 +34,19 @@ class HttpClient_WithAccessToken:
 
             self.user = UserApi(http)
 
-    def __init__(self, access_token: str, api_base: str = API_BASE_URLS.HTTP_DEFAULT):
+    def __init__(
+        self,
+        access_token: str,
+        api_base: str = API_BASE_URLS.HTTP_DEFAULT,
+        **http_options,
+    ):
+        """
+        - http_options: passed to HttpRequest, e.g. transport, session
+        """
         self.auth_token = access_token
-        self.http = _requests.HttpRequest(api_base, self._get_auth_token)
+        self.http = _requests.HttpRequest(
+            api_base, self._get_auth_token, **http_options
+        )
         self.api = self._ApiInterface(self.http)
 
     def _get_auth_token(self, *args, **kwargs):  # ignore arguments
@@ -1,10 +1,75 @@
 import json
+import threading
 from base64 import urlsafe_b64decode
+from dataclasses import dataclass
+
+import httpx
 
 from ..utils import base64_pad_equal_sign
+from ._message import MessageKeyring
+from ._sign import AuthTokenSigner, PinEncryptor, PinIterator
+
 
+class _KeysConfig:
+    """Signer and PIN encryptor of a config, created from its keys on first use,
+    shared by AppConfig and NetworkUserConfig.
 
-class AppConfig:
+    Subclasses have session_id, pin_token, private_key and key_algorithm,
+    and return the id of the auth token by _auth_user_id()
+    """
+
+    def __init__(self):
+        self._auth_token_signer = None
+        self._pin_encryptor = None
+        self._pin_iterator_file = None
+        self._pin_lock = threading.Lock()
+
+    def _auth_user_id(self) -> str:
+        raise NotImplementedError
+
+    @property
+    def auth_token_signer(self) -> AuthTokenSigner:
+        """Signer of API auth tokens, created on first use"""
+        if not self._auth_token_signer:
+            self._auth_token_signer = AuthTokenSigner(
+                self._auth_user_id(),
+                self.session_id,
+                self.private_key,
+                self.key_algorithm,
+            )
+        return self._auth_token_signer
+
+    @property
+    def pin_encryptor(self) -> PinEncryptor:
+        """Encryptor of PIN, created on first use"""
+        with self._pin_lock:  # one iterator per config
+            if not self._pin_encryptor:
+                self._pin_encryptor = PinEncryptor(
+                    self.pin_token,
+                    self.private_key,
+                    self.key_algorithm,
+                    self.session_id,
+                    PinIterator(self._pin_iterator_file),
+                )
+            return self._pin_encryptor
+
+    @property
+    def pin_iterator_file(self) -> str:
+        """File of the last PIN iterator, set it if multiple processes use
+        the same keystore, see PinIterator. Must be set before the first use
+        of pin_encryptor, raises RuntimeError after
+        """
+        return self._pin_iterator_file
+
+    @pin_iterator_file.setter
+    def pin_iterator_file(self, path: str):
+        with self._pin_lock:
+            if self._pin_encryptor and path != self._pin_iterator_file:
+                raise RuntimeError("Set pin_iterator_file before using pin_encryptor")
+            self._pin_iterator_file = path
+
+
+class AppConfig(_KeysConfig):
     """
     Config object of Mixin applications
     (such as Mixin Messenger bot)
@@ -28,6 +93,19 @@ class AppConfig:
             # ed25519 private key bytes
             self.private_key = urlsafe_b64decode(key.encode())
 
+        super().__init__()
+        self._message_keyring = None
+
+    def _auth_user_id(self) -> str:
+        return self.client_id
+
+    @property
+    def message_keyring(self) -> MessageKeyring:
+        """Keys of encrypted messages, created on first use, None if not Ed25519"""
+        if not self._message_keyring and self.key_algorithm == "Ed25519":
+            self._message_keyring = MessageKeyring(self.private_key)
+        return self._message_keyring
+
     @classmethod
     def from_payload(cls, payload: dict) -> "AppConfig":
         """
@@ -59,7 +137,7 @@ class AppConfig:
             return cls.from_payload(f.read())
 
 
-class NetworkUserConfig:
+class NetworkUserConfig(_KeysConfig):
     """
     Config object of mixin network user(created by application user)
     """
@@ -91,6 +169,10 @@ class NetworkUserConfig:
             self.public_key = None
 
         self.key_algorithm = "Ed25519"
+        super().__init__()
+
+    def _auth_user_id(self) -> str:
+        return self.user_id
 
     @classmethod
     def from_payload(cls, payload: dict) -> "NetworkUserConfig":
@@ -123,3 +205,37 @@ class NetworkUserConfig:
     def from_file(cls, file_path: str) -> "NetworkUserConfig":
         with open(file_path, "rt") as f:
             return cls.from_payload(f.read())
+
+
+@dataclass
+class HttpTransportConfig:
+    """
+    Connection pool options of HTTP clients
+
+    - max_connections: maximum number of concurrent connections
+    - max_keepalive_connections: maximum number of idle connections kept in pool
+    - keepalive_expiry: seconds to keep an idle connection open
+    - http2: enable HTTP/2 multiplexing, requires `pip install httpx[http2]`
+    - prewarm: open a connection when the client is created
+        (async clients: on entering `async with`)
+    """
+
+    max_connections: int = 100
+    max_keepalive_connections: int = 20
+    keepalive_expiry: float = 5.0
+    http2: bool = False
+    prewarm: bool = False
+
+    def _limits(self):
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive_connections,
+            keepalive_expiry=self.keepalive_expiry,
+        )
+
+    def create_session(self) -> httpx.Client:
+        """Create a session, can be shared by many clients with `session=` option"""
+        return httpx.Client(limits=self._limits(), http2=self.http2)
+
+    def create_async_session(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(limits=self._limits(), http2=self.http2)
@@ -1,6 +1,13 @@
 class RequestError(BaseException):
-    def __init__(self, status_code, message):
+    def __init__(self, status_code, message, status=None, retry_after=None):
+        """
+        - status_code: Mixin error code, or HTTP status code
+        - status: HTTP status of the error, None if no response (network error)
+        - retry_after: seconds, from the `Retry-After` response header
+        """
         self.status_code = status_code
+        self.status = status
+        self.retry_after = retry_after
         self.message = f"{status_code} {message}"
         super().__init__(self.message)
 
@@ -10,3 +17,13 @@ class RequestTimeout(RequestError):
         if not status_code:
             status_code = 408
         super().__init__(status_code, message)
+
+
+class SendQueueFull(Exception):
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        super().__init__(f"Sending queue is full, maxsize: {maxsize}")
+
+
+class PaginationError(Exception):
+    """Paginated list can't be iterated, e.g. the offset can't move"""
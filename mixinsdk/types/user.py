@@ -19,3 +19,14 @@ class UserProfile:
         self.name = name
         self.avatar_url = avatar_url
         self.is_app = is_app
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "UserProfile":
+        """from user data of API response"""
+        return cls(
+            data["user_id"],
+            data.get("identity_number", ""),
+            data.get("full_name", ""),
+            data.get("avatar_url", ""),
+            bool(data.get("app")) or bool(data.get("app_id")),
+        )
@@ -16,9 +16,12 @@ def parse_rfc3339_to_datetime(s: str):
     """
     [datestr, timestr] = s.split("T")
     [year, month, day] = datestr.split("-")
-    [hour, minute, second] = timestr.split(":")
-    [second, nano_sec] = second.split(".")
-    microsec = int(nano_sec.rstrip("Z")[:6])
+    [hour, minute, second] = timestr.rstrip("Z").split(":")
+    if "." in second:
+        [second, nano_sec] = second.split(".")
+        microsec = int(nano_sec[:6].ljust(6, "0"))
+    else:
+        microsec = 0
 
     return datetime.datetime(
         int(year),
@@ -31,6 +34,16 @@ def parse_rfc3339_to_datetime(s: str):
     )
 
 
+def format_datetime_to_rfc3339(dt: datetime.datetime) -> str:
+    """
+    Format naive UTC (or aware) datetime to RFC3339Nano,
+        e.g. `2020-12-12T12:12:12.999999000Z`
+    """
+    if dt.tzinfo:
+        dt = dt.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return dt.strftime("%Y-%m-%dT%H:%M:%S.%f") + "000Z"
+
+
 def get_conversation_id_of_two_users(a_user_id, b_user_id):
     """Get conversation id of single chat between two users, such as bot and user."""
     min_id = a_user_id
@@ -24,7 +24,7 @@ setuptools.setup(
         "License :: OSI Approved :: MIT License",
         "Operating System :: OS Independent",
     ],
-    packages=setuptools.find_packages(exclude=["examples"]),
+    packages=setuptools.find_packages(exclude=["examples", "benchmarks"]),
     python_requires=">=3.8",
     install_requires=[
         "requests",
@@ -35,4 +35,8 @@ setuptools.setup(
         "websockets",
         "dacite",
     ],
+    extras_require={
+        "http2": ["httpx[http2]"],
+        "orjson": ["orjson"],
+    },
 )
@@ -0,0 +1,61 @@
+import pytest
+
+from mixinsdk.api._pagination import PageWalker
+from mixinsdk.types.errors import PaginationError
+
+T1 = "2022-09-18T08:04:04.000000001Z"
+T2 = "2022-09-18T08:04:05.000000001Z"
+T3 = "2022-09-18T08:04:06.000000001Z"
+
+
+def walk(rows: list, limit: int) -> list:
+    """Pages of a server with inclusive created_at offset, ASC order"""
+    walker = PageWalker(limit)
+    offset = None
+    result = []
+    for _ in range(100):
+        page = [r for r in rows if offset is None or r["created_at"] >= offset]
+        page, offset = walker.accept(page[:limit])
+        result.extend(r["snapshot_id"] for r in page)
+        if walker.finished:
+            return result
+    raise AssertionError(f"not finished: {result}")
+
+
+def test_same_time_rows_across_pages():
+    rows = [
+        {"snapshot_id": "a", "created_at": T1},
+        {"snapshot_id": "b", "created_at": T2},
+        {"snapshot_id": "c", "created_at": T2},
+        {"snapshot_id": "d", "created_at": T2},
+        {"snapshot_id": "e", "created_at": T3},
+    ]
+    for limit in (4, 5, 10):
+        assert walk(rows, limit) == ["a", "b", "c", "d", "e"]
+
+
+def test_more_same_time_rows_than_limit():
+    # the offset can't move past T2, without the error the walker loops
+    rows = [{"snapshot_id": "a", "created_at": T1}]
+    rows += [{"snapshot_id": f"b{i}", "created_at": T2} for i in range(5)]
+    rows += [{"snapshot_id": "c", "created_at": T3}]
+    with pytest.raises(PaginationError):
+        walk(rows, 3)
+
+
+def test_first_page_url_has_no_offset():
+    import httpx
+
+    from mixinsdk.api.pin import PinApi
+    from mixinsdk.clients._requests import HttpRequest
+
+    urls = []
+
+    def handler(request):
+        urls.append(str(request.url))
+        return httpx.Response(200, json={"data": []})
+
+    http = HttpRequest("https://api.example", lambda *args: "")
+    http.session = httpx.Client(transport=httpx.MockTransport(handler))
+    assert list(PinApi(http).iter_error_logs()) == []
+    assert urls == ["https://api.example/logs?limit=100&category=PIN_INCORRECT"]